@@ -1,4 +1,4 @@
-import translate
+import translate, diskCache, downloadManager, modStore, modRecords  # local modules
 from usefulVariables import *  # local variables
 import locale
 from packaging.version import Version
@@ -7,14 +7,18 @@ import PyQt5.QtWidgets as Qt
 from PyQt5.QtWidgets import QMessageBox
 from PyQt5 import QtCore, QtGui
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime
 import minecraft_launcher_lib
 import traceback
 import platformdirs
 import threading
 import subprocess
+from requests.adapters import HTTPAdapter
 import requests
 import logging
+import hashlib
 import shutil
 import glob
 import json
@@ -41,15 +45,41 @@ class Methods():
         """a class containing usefull methods and threads"""
         self.curseforgeModloaders = {"fabric": 4, "forge": 1, "neoforge": 6, "quilt": 5}
         self.curseforgeReleases = {1: "release", 2: "beta", 3: "alpha"}
+        self.releaseStabilities = {"release": 1, "beta": 2, "alpha": 3}  # lower is more stable, the same numbers as curseforge
+        self.curseforgeHashAlgos = {1: "sha1", 2: "md5"}
+        self.curseforgeRequiredDependency = 3  # relation types of the dependencies of a curseforge file
+        self.curseforgeIncompatibility = 5
+        self.profiles = None  # profiles index, loaded on first use
+        self.profilesMtime = None
+        self.manifests = {}  # profile -> (modification time, manifest of the installed mods)
+        self.manifestLock = threading.RLock()
+        self.curseforgeValidators = OrderedDict()  # (endpoint, params) -> (etag, data) of the last answers of the proxy, to only download them again if they changed
+        self.curseforgeValidatorsLock = threading.Lock()
         profilesDir.mkdir(parents=True, exist_ok=True)
         cacheDir.mkdir(parents=True, exist_ok=True)
 
         if not settingsFile.exists():
             with open(settingsFile, "w", encoding="utf-8") as f:
                 json.dump({"minecraftFolder": minecraft_launcher_lib.utils.get_minecraft_directory(),
-                           "offlineUsername": "Player"}, f, indent=4)
+                           "offlineUsername": "Player", **defaultSettings}, f, indent=4)
         self.loadSettings()
         self.minecraftModsPath.mkdir(parents=True, exist_ok=True)
+        if (cacheDir/"previousMods").exists() and not launchJournalFile.exists():  # backup left by an older version of the app
+            self.writeJson(launchJournalFile, {"state": "saved", "modsPath": str(self.minecraftModsPath), "backupPath": str(cacheDir/"previousMods")})
+        if launchJournalFile.exists():
+            log.warning("the previous game launch was interrupted, restoring the previous mods")
+            self.restorePreviousMods()
+        self.cache = diskCache.DiskCache(cacheDir, cacheTtls, self.cacheMaxSize*1024*1024)
+        self.cache.evict()
+        self.modStore = modStore.ModStore(storeDir, appDataDir)
+        self.modStore.collect()
+        self.iconFetcher = IconFetcher(self, self.iconDownloadWorkers)
+        self.downloadManager = downloadManager.DownloadManager(self, self.maxConcurrentDownloads, self.downloadSpeedLimit)
+        self.signals = BackendSignals()
+        self.backgroundExecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="revalidation")
+        self.revalidating = set()  # cache paths being revalidated in the background
+        self.searchExecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search")  # searches run here so they never freeze the interface
+        self.revalidatingLock = threading.Lock()
 
     def loadSettings(self):
         """load values from the settings the settings"""
@@ -59,28 +89,150 @@ class Methods():
             self.minecraftAppdataPath = Path(settings["minecraftFolder"])
             self.minecraftModsPath = self.minecraftAppdataPath/"mods"
             self.offlineUsername = settings["offlineUsername"]
+            self.requestTimeout = (settings.get("connectTimeout", defaultSettings["connectTimeout"]), settings.get("readTimeout", defaultSettings["readTimeout"]))
+            self.connectionPoolSize = settings.get("connectionPoolSize", defaultSettings["connectionPoolSize"])
+            self.iconDownloadWorkers = settings.get("iconDownloadWorkers", defaultSettings["iconDownloadWorkers"])
+            self.cacheMaxSize = settings.get("cacheMaxSize", defaultSettings["cacheMaxSize"])
+            self.staleWhileRevalidate = settings.get("staleWhileRevalidate", defaultSettings["staleWhileRevalidate"])
+            self.maxConcurrentDownloads = settings.get("maxConcurrentDownloads", defaultSettings["maxConcurrentDownloads"])
+            self.downloadSpeedLimit = settings.get("downloadSpeedLimit", defaultSettings["downloadSpeedLimit"])
+            self.buildSession()
+
+    def buildSession(self):
+        """build the http session shared by every network request, keeping connections alive in a pool for each host"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(availablePlatforms)+4, pool_maxsize=self.connectionPoolSize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = f"ilwan07/MinecraftModManager/{appVersion}"
+        self.session = session  # previous session is left to in-flight requests, it will be garbage collected
+
+    def httpGet(self, url:str, **kwargs) -> requests.Response:
+        """make a GET request using the shared session and the configured timeouts"""
+        kwargs.setdefault("timeout", self.requestTimeout)
+        return self.session.get(url, **kwargs)
+
+    def writeJson(self, path:Path, data, compact:bool=False):
+        """write json data to a file atomically, so it is never read half written, compact for big files nobody reads by hand"""
+        tempPath = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+        with open(tempPath, "w", encoding="utf-8") as f:
+            if compact:
+                json.dump(data, f, separators=(",", ":"))
+            else:
+                json.dump(data, f, indent=4)
+        os.replace(tempPath, path)
+
+    def cachedJsonRequest(self, cachePath:Path, kind:str, url:str, refreshKey:tuple=None, **params) -> dict:
+        """get json data from the cache if fresh, else revalidate it with a conditional request,
+        if enabled outdated data is returned at once and revalidated in the background, emitting projectRefreshed with refreshKey if it changed"""
+        if self.cache.isFresh(cachePath):
+            with open(cachePath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        if self.staleWhileRevalidate and cachePath.exists():
+            with open(cachePath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self.revalidatingLock:
+                if cachePath not in self.revalidating:
+                    self.revalidating.add(cachePath)
+                    self.backgroundExecutor.submit(self.revalidateJson, cachePath, kind, url, refreshKey, params)
+            return data
+        return self.revalidateJson(cachePath, kind, url, None, params)
+
+    def revalidateJson(self, cachePath:Path, kind:str, url:str, refreshKey:tuple, params:dict) -> dict:
+        """request json data sending the cached validators, a 304 answer reuses the cached file without downloading it again"""
+        headers = {}
+        if cachePath.exists():
+            validators = self.cache.getValidators(cachePath)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("lastModified"):
+                headers["If-Modified-Since"] = validators["lastModified"]
+        try:
+            response = self.httpGet(url, params=params, headers=headers)
+            if response.status_code == 304:
+                self.cache.refresh(cachePath)
+                log.debug(f"cached data for {url} is still valid")
+                with open(cachePath, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            log.error(f"error while revalidating {url} : {e}")
+            if cachePath.exists():  # better outdated than nothing
+                with open(cachePath, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            return None
+        finally:
+            with self.revalidatingLock:
+                self.revalidating.discard(cachePath)
+        validators = {"etag": response.headers.get("ETag"), "lastModified": response.headers.get("Last-Modified")}
+        previousData = None
+        if cachePath.exists():  # many answers come without validators, only rewrite and reload what really changed
+            try:
+                with open(cachePath, "r", encoding="utf-8") as f:
+                    previousData = json.load(f)
+            except (OSError, ValueError):
+                previousData = None
+        if previousData == data:
+            self.cache.store(cachePath, kind, validators)
+            log.debug(f"cached data for {url} did not change")
+            return data
+        cachePath.parent.mkdir(parents=True, exist_ok=True)
+        self.writeJson(cachePath, data)
+        self.cache.store(cachePath, kind, validators)
+        if refreshKey:
+            self.signals.projectRefreshed.emit(*refreshKey)
+        return data
 
     def curseforgeRequest(self, endpoint, **params) -> dict:
         """make a generic request to the curseforge api via the proxy containing the api key"""
         url = f"{curseForgeApi}/{endpoint}"
+        key = (endpoint, tuple(sorted(params.items())))
+        with self.curseforgeValidatorsLock:
+            validator = self.curseforgeValidators.get(key)
 
         try:
-            response = requests.get(url, params=params)
+            # the proxy answers 304 without a body if the answer we already have is still the same
+            response = self.httpGet(url, params=params, headers={"If-None-Match": validator[0]} if validator else None)
             response.raise_for_status()  # check if response is valid
+            if response.status_code == 304 and validator:
+                with self.curseforgeValidatorsLock:
+                    if key in self.curseforgeValidators:
+                        self.curseforgeValidators.move_to_end(key)
+                return validator[1]
             if response.status_code != 200:
                 log.warning(f"got status code {response.status_code} while requesting curseforge proxy\nusing endpoint '{endpoint}' with params {params}")
-            return response.json()
+            data = response.json()
+            etag = response.headers.get("ETag")
+            if etag and response.status_code == 200:
+                with self.curseforgeValidatorsLock:
+                    self.curseforgeValidators[key] = (etag, data)
+                    self.curseforgeValidators.move_to_end(key)
+                    while len(self.curseforgeValidators) > curseforgeMaxValidators:
+                        self.curseforgeValidators.popitem(last=False)
+            return data
         except requests.exceptions.RequestException as e:
             log.error(f"error while requesting to curseforge proxy : {e}\nusing endpoint '{endpoint}' with params {params}")
             return None
     
-    def curseforgeSearchMod(self, query:str, modloader:str, onlyCompatible:bool=False, version:str=None, nbResults:int=50) -> dict:
-        """search for a mod on curseforge"""
+    def curseforgePostRequest(self, endpoint:str, body:dict) -> dict:
+        """make a request with a json body to the curseforge api via the proxy, used by the bulk endpoints"""
+        url = f"{curseForgeApi}/{endpoint}"
+        try:
+            response = self.session.post(url, json=body, timeout=self.requestTimeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            log.error(f"error while requesting to curseforge proxy : {e}\nusing endpoint '{endpoint}' with a body of {len(body)} keys")
+            return None
+    
+    def curseforgeSearchMod(self, query:str, modloader:str, onlyCompatible:bool=False, version:str=None, nbResults:int=50, index:int=0) -> dict:
+        """search for a mod on curseforge, starting at the given result index"""
         if onlyCompatible:
-            result = self.curseforgeRequest(endpoint="mods/search", gameId=432, searchFilter=query, modLoaderType=self.curseforgeModloaders[modloader.lower()], pageSize=nbResults, classId=6, gameVersion=version)
+            result = self.curseforgeRequest(endpoint="mods/search", gameId=432, searchFilter=query, modLoaderType=self.curseforgeModloaders[modloader.lower()], pageSize=nbResults, index=index, classId=6, gameVersion=version)
         else:
-            result = self.curseforgeRequest(endpoint="mods/search", gameId=432, searchFilter=query, modLoaderType=self.curseforgeModloaders[modloader.lower()], pageSize=nbResults, classId=6)
-        result = {"data": [mod for mod in result["data"] if mod["allowModDistribution"]]}  # filter out mods that don't allow distribution
+            result = self.curseforgeRequest(endpoint="mods/search", gameId=432, searchFilter=query, modLoaderType=self.curseforgeModloaders[modloader.lower()], pageSize=nbResults, index=index, classId=6)
+        result = {"data": [mod for mod in result["data"] if mod["allowModDistribution"]], "pagination": result["pagination"]}  # filter out mods that don't allow distribution
         log.info(f"searched for mod on curseforge: {query}")
         return result
 
@@ -88,7 +240,7 @@ class Methods():
         """directly make a generic request to the modrinth api"""
         url = f"{modrinthApi}/{endpoint}"
         try:
-            response = requests.get(url, params=params)
+            response = self.httpGet(url, params=params)
             response.raise_for_status()
             if response.status_code != 200:
                 log.warning(f"got status code {response.status_code} while requesting curseforge proxy\nusing endpoint '{endpoint}' with params {params}")
@@ -97,21 +249,92 @@ class Methods():
             log.error(f"error while requesting to modrinth api : {e}\nusing endpoint '{endpoint}' with params {params}")
             return None
     
-    def modrinthSearchMod(self, query:str, modloader:str, onlyCompatible:bool=False, version:str=None, nbResults:int=100) -> dict:
-        """search for a mod on modrinth"""
+    def modrinthPostRequest(self, endpoint:str, body:dict) -> dict:
+        """directly make a request with a json body to the modrinth api, used by the bulk endpoints"""
+        url = f"{modrinthApi}/{endpoint}"
+        try:
+            response = self.session.post(url, json=body, timeout=self.requestTimeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            log.error(f"error while requesting to modrinth api : {e}\nusing endpoint '{endpoint}' with a body of {len(body)} keys")
+            return None
+    
+    def modrinthSearchMod(self, query:str, modloader:str, onlyCompatible:bool=False, version:str=None, nbResults:int=100, offset:int=0) -> dict:
+        """search for a mod on modrinth, skipping the given number of results"""
         if onlyCompatible:
-            result = self.modrinthRequest(endpoint="search", query=query, facets=f'[["categories:{modloader.lower()}"],["versions:{version}"]]', limit=nbResults)
+            result = self.modrinthRequest(endpoint="search", query=query, facets=f'[["categories:{modloader.lower()}"],["versions:{version}"]]', limit=nbResults, offset=offset)
         else:
-            result = self.modrinthRequest(endpoint="search", query=query, facets=f'[["categories:{modloader.lower()}"]]', limit=nbResults)
+            result = self.modrinthRequest(endpoint="search", query=query, facets=f'[["categories:{modloader.lower()}"]]', limit=nbResults, offset=offset)
         log.info(f"searched for mod on modrinth: {query}")
         return result
 
-    def searchMod(self, query:str, platform:str, modloader:str, onlyCompatible:bool=False, version:str=None, nbResults:int=50) -> dict:
-        """search for a mod on a specific platform"""
-        if platform.lower() == "modrinth":
-            return self.modrinthSearchMod(query, modloader.lower(), onlyCompatible, version, nbResults)
+    def searchMods(self, query:str, platform:str, modloader:str, onlyCompatible:bool=False, version:str=None, page:int=0) -> tuple:
+        """search for a mod on a specific platform or on all of them, return the list of mods data of a page of results
+        and whether there are more pages, safe to call from a worker thread"""
+        start = page*searchPageSize
+        if platform.lower() == "all":
+            return self.searchAllPlatforms(query, modloader, onlyCompatible, version, page)
+        elif platform.lower() == "modrinth":
+            result = self.modrinthSearchMod(query, modloader.lower(), onlyCompatible, version, searchPageSize, start)
+            return self.modrinthSearchToMods(result), start + searchPageSize < result["total_hits"]
         elif platform.lower() == "curseforge":
-            return self.curseforgeSearchMod(query, modloader.lower(), onlyCompatible, version, nbResults)
+            if start >= curseforgeMaxSearchResults:
+                return [], False
+            result = self.curseforgeSearchMod(query, modloader.lower(), onlyCompatible, version, searchPageSize, start)
+            return self.curseforgeSearchToMods(result), start + searchPageSize < min(result["pagination"]["totalCount"], curseforgeMaxSearchResults)
+        log.error(f"unknown platform: {platform}")
+        return [], False
+
+    def searchAllPlatforms(self, query:str, modloader:str, onlyCompatible:bool=False, version:str=None, page:int=0) -> tuple:
+        """search for a mod on every platform at the same time and merge the results, only fails if every platform failed"""
+        with ThreadPoolExecutor(max_workers=len(availablePlatforms), thread_name_prefix="search") as executor:
+            futures = {platform: executor.submit(self.searchMods, query, platform, modloader, onlyCompatible, version, page) for platform in availablePlatforms}
+        results = []
+        hasMore = False
+        error = None
+        for platform, future in futures.items():
+            try:
+                mods, platformHasMore = future.result()
+                results.append(mods)
+                hasMore = hasMore or platformHasMore
+            except Exception as e:
+                log.error(f"search for {query} on {platform} failed: {e}")
+                error = e
+        if not results:
+            raise error
+        return self.mergeSearchResults(results), hasMore
+
+    def searchKey(self, text:str) -> str:
+        """normalize a name to compare it between platforms"""
+        return "".join(char for char in text.lower() if char.isalnum())
+
+    def mergeSearchResults(self, resultsLists:list) -> list:
+        """merge the results of several platforms by alternating their ranks,
+        a mod published on several platforms is kept once if it has the same slug or name and a common author, or both the same slug and name"""
+        entries = []  # (mod data, normalized authors)
+        slugs = {}  # normalized slug -> index in entries
+        names = {}  # normalized name -> index in entries
+        for rank in range(max((len(mods) for mods in resultsLists), default=0)):
+            for mods in resultsLists:
+                if rank >= len(mods):
+                    continue
+                mod = mods[rank]
+                slug, name = self.searchKey(mod["slug"]), self.searchKey(mod["name"])
+                authors = {self.searchKey(author) for author in mod["author"].split(",")} - {""}
+                for index in {slugs.get(slug), names.get(name)} - {None}:
+                    other, otherAuthors = entries[index]
+                    sameSlug, sameName = self.searchKey(other["slug"]) == slug, self.searchKey(other["name"]) == name
+                    if mod["platform"] not in other["availableOn"] and ((sameSlug and sameName) or authors & otherAuthors):
+                        other["availableOn"].append(mod["platform"])
+                        other["alternatives"][mod["platform"]] = mod
+                        break
+                else:
+                    slugs.setdefault(slug, len(entries))
+                    names.setdefault(name, len(entries))
+                    entries.append(({**mod, "availableOn": [mod["platform"]], "alternatives": {}}, authors))
+        log.debug(f"merged {sum(len(mods) for mods in resultsLists)} search results into {len(entries)} mods")
+        return [mod for mod, authors in entries]
     
     def listMcVersions(self, onlyReleases:bool=True) -> list:
         """returns a list of all the minecraft versions"""
@@ -124,50 +347,131 @@ class Methods():
         return self.onlyMinecraftVersions
 
     def getProfiles(self) -> dict:
-        """get a dictionary of all the profiles and their properties"""
-        self.profiles = {}
-        for profile in [Path(item).name for item in glob.glob(str(profilesDir/"*"))]:
-            with open(profilesDir/profile/"properties.json", "r", encoding="utf-8") as f:
-                self.profiles[profile] = json.load(f)
+        """get a dictionary of all the profiles and their properties, only read again when the profiles folder changed"""
+        mtime = profilesDir.stat().st_mtime_ns  # changes when a profile is created, removed or renamed
+        if self.profiles is None or mtime != self.profilesMtime:
+            profiles = {}
+            for profile in [Path(item).name for item in glob.glob(str(profilesDir/"*"))]:
+                with open(profilesDir/profile/"properties.json", "r", encoding="utf-8") as f:
+                    profiles[profile] = json.load(f)
+            self.profiles = profiles
+            self.profilesMtime = mtime
+            log.debug(f"loaded the index of {len(profiles)} profiles")
         return self.profiles
+
+    def loadManifest(self, profile:str) -> dict:
+        """get the manifest of the mods installed in a profile, only read again when the file changed,
+        the profiles made by older versions with a properties.json file per mod are migrated"""
+        manifestPath = profilesDir/profile/"mods.json"
+        with self.manifestLock:
+            if not manifestPath.exists():
+                self.migrateManifest(profile)
+            mtime = manifestPath.stat().st_mtime_ns
+            if profile in self.manifests and self.manifests[profile][0] == mtime:
+                return self.manifests[profile][1]
+            with open(manifestPath, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.manifests[profile] = (mtime, manifest)
+            return manifest
+
+    def saveManifest(self, profile:str, manifest:dict):
+        """write the manifest of a profile atomically"""
+        manifestPath = profilesDir/profile/"mods.json"
+        with self.manifestLock:
+            self.writeJson(manifestPath, manifest)
+            self.manifests[profile] = (manifestPath.stat().st_mtime_ns, manifest)
+
+    def setManifestMod(self, profile:str, platform:str, modId:str, modData:dict=None):
+        """add, update or with no data remove a mod in the manifest of a profile"""
+        with self.manifestLock:
+            manifest = self.loadManifest(profile)
+            if modData is None:
+                manifest["mods"].pop(f"{platform.lower()}/{modId}", None)
+            else:
+                manifest["mods"][f"{platform.lower()}/{modId}"] = modData
+            self.saveManifest(profile, manifest)
+
+    def migrateManifest(self, profile:str):
+        """build the manifest of a profile from the properties.json file of each mod, then remove them"""
+        manifest = {"mods": {}}
+        oldProperties = []
+        fileHashes = self.adoptProfileFiles(profile)  # profiles of older versions were made before the store, share their files once
+        for platform in availablePlatforms:
+            for propertiesPath in (profilesDir/profile/platform).glob("*/properties.json"):
+                with open(propertiesPath, "r", encoding="utf-8") as f:
+                    modData = json.load(f)
+                modFile = propertiesPath.parent/modData["fileName"]
+                modData["fileSize"] = modFile.stat().st_size if modFile.exists() else 0
+                if modFile in fileHashes:  # so the file is never hashed again to check updates or apply the profile
+                    modData["hashes"] = {**(modData.get("hashes") or {}), "sha1": fileHashes[modFile]}
+                manifest["mods"][f"{platform}/{propertiesPath.parent.name}"] = modData
+                oldProperties.append(propertiesPath)
+        self.saveManifest(profile, manifest)
+        for propertiesPath in oldProperties:
+            propertiesPath.unlink()
+        log.info(f"created the mods manifest of profile {profile} with {len(manifest['mods'])} mods")
+
+    def getProfile(self, profile:str) -> dict:
+        """get the properties of a profile from the profiles index"""
+        return self.getProfiles().get(profile)
+
+    def invalidateProfiles(self):
+        """force the profiles index and the mods manifests to be read again, after a profile was modified"""
+        self.profiles = None
+        with self.manifestLock:
+            self.manifests.clear()
     
     def modrinthSearchToMods(self, searchResult:dict) -> list:
-        """convert a search result from modrinth to a list of mods data with the name, author, id, platform and icon path in cache, and the complete raw data"""
+        """convert a search result from modrinth to a list of mods data with the name, author, id, platform, slug, webpage and icon path in cache and url"""
         iconCacheDir = cacheDir/"modIcons"/"modrinth"
-        self.mods = []
+        mods = []
         for mod in searchResult["hits"]:
             if mod["project_type"] == "mod": # only accept mods, no modpacks
-                self.mods.append({"name": mod["title"], "author": mod["author"], "id": mod["project_id"], "platform": "modrinth",
-                                  "icon": iconCacheDir/f"{mod['project_id']}.png", "webpage": f"https://modrinth.com/mod/{mod['slug']}", "rawData": mod})
-        return self.mods
+                mods.append({"name": mod["title"], "author": mod["author"], "id": mod["project_id"], "platform": "modrinth", "slug": mod["slug"],
+                                  "icon": iconCacheDir/f"{mod['project_id']}.png", "iconUrl": mod["icon_url"], "availableOn": ["modrinth"],
+                                  "webpage": f"https://modrinth.com/mod/{mod['slug']}"})
+        return mods
 
     def curseforgeSearchToMods(self, searchResult:dict) -> list:
-        """convert a search result from curseforge to a list of mods data with the name, author, id, platform and icon path in cache, and the complete raw data"""
+        """convert a search result from curseforge to a list of mods data with the name, author, id, platform, slug, webpage and icon path in cache and url"""
         iconCacheDir = cacheDir/"modIcons"/"curseforge"
-        self.mods = []
+        mods = []
         for mod in searchResult["data"]:
             authors = ", ".join([author["name"] for author in mod["authors"]])
-            self.mods.append({"name": mod["name"], "author": authors, "id": str(mod["id"]), "platform": "curseforge",
-                              "icon": iconCacheDir/f"{mod['id']}.png", "webpage": mod["links"]["websiteUrl"], "rawData": mod})
-        return self.mods
+            iconUrl = mod["logo"].get("thumbnailUrl") if mod.get("logo") else None
+            mods.append({"name": mod["name"], "author": authors, "id": str(mod["id"]), "platform": "curseforge", "slug": mod["slug"],
+                              "icon": iconCacheDir/f"{mod['id']}.png", "iconUrl": iconUrl, "availableOn": ["curseforge"],
+                              "webpage": mod["links"]["websiteUrl"]})
+        return mods
     
-    def downloadIcon(self, platform:str, id:str, iconUrl:str, modWidget=None):
-        """download the icon of a mod in cache, eventually updating the widget when downloaded"""
+    def downloadIcon(self, platform:str, id:str, iconUrl:str) -> bool:
+        """download the icon of a mod in cache, return True if it was downloaded"""
         iconCacheDir = cacheDir/"modIcons"/platform.lower()
         iconCacheDir.mkdir(parents=True, exist_ok=True)
-        if not (iconCacheDir/f"{id}.png").exists():
-            if iconUrl:  # if the mod has an icon
-                with open(iconCacheDir/f"{id}.png", "wb") as f:
-                    f.write(requests.get(iconUrl).content)
-                if modWidget:
-                    modWidget.updateIcon()
+        iconPath = iconCacheDir/f"{id}.png"
+        if (iconPath.exists() and self.cache.isFresh(iconPath)) or not iconUrl:  # already in cache or the mod has no icon
+            return False
+        tempPath = iconCacheDir/f"{id}.png.{threading.get_ident()}.part"  # unique per thread so concurrent downloads never share a file
+        try:
+            response = self.httpGet(iconUrl)
+            response.raise_for_status()
+            with open(tempPath, "wb") as f:
+                f.write(response.content)
+            os.replace(tempPath, iconPath)  # atomic, the icon is never seen half written
+            self.cache.store(iconPath, "modIcons")
+        except (requests.exceptions.RequestException, OSError) as e:
+            log.error(f"unable to download icon of mod {id} from {platform}: {e}")
+            tempPath.unlink(missing_ok=True)
+            return False
+        return True
 
     def getModInfos(self, modId:str, platform:str) -> dict:
-        """do a request to get every informations about a mod"""
+        """get every informations about a mod, from the cache if possible"""
+        cachePath = cacheDir/"modsData"/platform.lower()/f"{modId}.json"
         if platform.lower() == "modrinth":
-            return self.modrinthRequest(f"project/{modId}")
+            return self.cachedJsonRequest(cachePath, "modsData", f"{modrinthApi}/project/{modId}", ("modrinth", modId))
         elif platform.lower() == "curseforge":
-            return self.curseforgeRequest(f"mods/{modId}")
+            return self.cachedJsonRequest(cachePath, "modsData", f"{curseForgeApi}/mods/{modId}", ("curseforge", modId))
     
     def cleanHtml(self, html:str) -> str:
         """clean an html string from all the links and images, replacing them with a textual version"""
@@ -180,151 +484,510 @@ class Methods():
             img.decompose()
         return str(soup)
     
-    def getVersionsInfos(self, modId:str, platform:str, modloader:str, onlyCompatible:bool=False, mcVersion:str=None) -> dict:
-        """get a dictionary of all the versions of a mod with version as key,
-        then the minecraft versions, version id, the mod id, the platform, the modloader, the release type, the download url and the filename"""
-        self.modVersions = {}
-        self.modVersionsData = []
-        self.modVersionThreads = []
-
+    def getVersionsInfos(self, modId:str, platform:str, modloader:str, onlyCompatible:bool=False, mcVersion:str=None) -> modRecords.ModVersions:
+        """get the versions of a mod for a modloader, newest first and indexed by id and minecraft version,
+        only the compatible versions are requested if onlyCompatible, the full history is only fetched otherwise"""
+        versions = []
         versionsDataCache = cacheDir/"modsVersions"/platform.lower()/modId
-        modsDataCache = cacheDir/"modsData"/platform.lower()
-        modsDataCache.mkdir(parents=True, exist_ok=True)
 
         if platform.lower() == "modrinth":
-            # either request and save or load the mod data
-            if (modsDataCache/f"{modId}.json").exists():
-                with open(modsDataCache/f"{modId}.json", "r", encoding="utf-8") as f:
-                    modData = json.load(f)
-            else:
-                modData = self.getModInfos(modId, platform.lower())
-                with open(modsDataCache/f"{modId}.json", "w", encoding="utf-8") as f:
-                    json.dump(modData, f, indent=4)
+            modData = self.getModInfos(modId, platform.lower())
             
             teamData = self.modrinthRequest(f"project/{modId}/members") if "team" in modData else None
             if teamData:
                 authors = ", ".join([member["user"]["username"] for member in teamData])
             else:
                 authors = ""
-            iconUrl = modData["icon_url"]
+            modInfo = modRecords.ModInfo(modId, "modrinth", modloader.lower(), modData["title"], authors, modData["icon_url"], f"https://modrinth.com/mod/{modData['slug']}")
             
-            versionsIds = modData["versions"]
-            if (versionsDataCache).exists():
-                self.modVersionsData = [json.load(open(versionsDataCache/f"{versionId}.json", "r", encoding="utf-8")) for versionId in versionsIds if (versionsDataCache/f"{versionId}.json").exists()]
+            if onlyCompatible:  # let modrinth filter the versions, much smaller than the full history
+                cachePath = cacheDir/"modsVersions"/"modrinth"/f"{modId}-{modloader.lower()}-{mcVersion}.json"
+                versionsData = self.cachedJsonRequest(cachePath, "modsVersions", f"{modrinthApi}/project/{modId}/version", ("modrinth", modId),
+                                                      loaders=f'["{modloader.lower()}"]', game_versions=f'["{mcVersion}"]') or []
             else:
+                versionsIds = modData["versions"]
+                # versions never change once published, so only the ones missing from the cache are requested
                 versionsDataCache.mkdir(parents=True, exist_ok=True)
-                self.modVersionsData = self.modrinthRequest("versions", ids=str(versionsIds).replace("'", '"'))
-                for versionData in self.modVersionsData:
-                    with open(versionsDataCache/f"{versionData['id']}.json", "w", encoding="utf-8") as f:
-                        json.dump(versionData, f, indent=4)
+                versionsData = [json.load(open(versionsDataCache/f"{versionId}.json", "r", encoding="utf-8")) for versionId in versionsIds if (versionsDataCache/f"{versionId}.json").exists()]
+                missingIds = [versionId for versionId in versionsIds if not (versionsDataCache/f"{versionId}.json").exists()]
+                if missingIds:
+                    newVersionsData = self.modrinthRequest("versions", ids=str(missingIds).replace("'", '"'))
+                    for versionData in newVersionsData:
+                        with open(versionsDataCache/f"{versionData['id']}.json", "w", encoding="utf-8") as f:
+                            json.dump(versionData, f, indent=4)
+                    versionsData.extend(newVersionsData)
+                    self.cache.store(versionsDataCache, "modsVersions")
+                else:
+                    self.cache.isFresh(versionsDataCache)  # mark as used
             
-            self.modVersionsData.sort(key=lambda data: datetime.fromisoformat(data["date_published"].replace("Z", "")), reverse=True)
-            for versionData in self.modVersionsData:
+            versionsData.sort(key=lambda data: datetime.fromisoformat(data["date_published"].replace("Z", "")), reverse=True)
+            for versionData in versionsData:
                 if modloader.lower() in versionData["loaders"]:
                     if onlyCompatible:
                         if mcVersion not in versionData["game_versions"]:
                             continue
-                    self.modVersions[versionData["version_number"]] = {"mcVersions": versionData["game_versions"],
-                                                                       "versionId": versionData["id"],
-                                                                       "modId": modId, "platform": platform.lower(), "modloader": modloader.lower(),
-                                                                       "releaseType": versionData["version_type"],
-                                                                       "downloadUrl": versionData["files"][0]["url"],
-                                                                       "fileName": versionData["files"][0]["filename"],
-                                                                       "versionName": versionData["version_number"],
-                                                                       "modName": modData["title"],
-                                                                       "authors": authors,
-                                                                       "iconUrl": iconUrl,
-                                                                       "webpage": f"https://modrinth.com/mod/{modData['slug']}"}
+                    versions.append(self.modrinthVersionToRecord(versionData, modInfo))
         elif platform.lower() == "curseforge":
-            # either request and save or load the mod data
-            if (modsDataCache/f"{modId}.json").exists():
-                with open(modsDataCache/f"{modId}.json", "r", encoding="utf-8") as f:
-                    modData = json.load(f)
-            else:
-                modData = self.getModInfos(modId, platform.lower())
-                with open(modsDataCache/f"{modId}.json", "w", encoding="utf-8") as f:
-                    json.dump(modData, f, indent=4)
+            modData = self.getModInfos(modId, platform.lower())
 
             authors = ", ".join([author["name"] for author in modData["data"]["authors"]])
             iconUrl = modData["data"]["logo"]["thumbnailUrl"] if "logo" in modData["data"] else None
+            modInfo = modRecords.ModInfo(modId, "curseforge", modloader.lower(), modData["data"]["name"], authors, iconUrl, modData["data"]["links"]["websiteUrl"])
 
-            versionsIds = [modVersion["fileId"] for modVersion in modData["data"]["latestFilesIndexes"]]
-            if (versionsDataCache).exists():
-                self.modVersionsData = [json.load(open(versionsDataCache/f"{versionId}.json", "r", encoding="utf-8")) for versionId in versionsIds if (versionsDataCache/f"{versionId}.json").exists()]
+            if onlyCompatible:
+                filesData = self.getCompatibleCurseforgeFiles(modId, modloader.lower(), mcVersion)
             else:
-                versionsDataCache.mkdir(parents=True, exist_ok=True)
-                index = 0
-                self.modVersionsData = []
-                while index < len(versionsIds):
-                    self.modVersionsData.extend([{"data": version} for version in self.curseforgeRequest(f"mods/{modId}/files", pageSize=50, index=index)["data"]])
-                    index += 50
-                for versionData in self.modVersionsData:
-                    with open(versionsDataCache/f"{versionData['data']['id']}.json", "w", encoding="utf-8") as f:
-                        json.dump(versionData, f, indent=4)
-
-            self.modVersionsData.sort(key=lambda data: datetime.fromisoformat(data["data"]["fileDate"].replace("Z", "")), reverse=True)
-            for versionData in self.modVersionsData:
-                if modloader.lower() in [version.lower() for version in versionData["data"]["gameVersions"]]:
+                filesData = self.syncCurseforgeFiles(modId)
+            for fileData in filesData:
+                if modloader.lower() in [version.lower() for version in fileData["gameVersions"]]:
                     if onlyCompatible:
-                        if mcVersion not in versionData["data"]["gameVersions"]:
+                        if mcVersion not in fileData["gameVersions"]:
                             continue
-                    self.modVersions[versionData["data"]["displayName"]] = {"mcVersions": [mcVersion["gameVersion"] for mcVersion in versionData["data"]["sortableGameVersions"] if mcVersion["gameVersion"]],
-                                                                "versionId": versionData["data"]["id"],
-                                                                "modId": modId, "platform": platform.lower(), "modloader": modloader.lower(),
-                                                                "releaseType": self.curseforgeReleases[versionData["data"]["releaseType"]],
-                                                                "downloadUrl": versionData["data"]["downloadUrl"],
-                                                                "fileName": versionData["data"]["fileName"],
-                                                                "versionName": versionData["data"]["displayName"],
-                                                                "modName": modData["data"]["name"],
-                                                                "authors": authors,
-                                                                "iconUrl": iconUrl,
-                                                                "webpage": modData["data"]["links"]["websiteUrl"]}
+                    versions.append(self.curseforgeVersionToRecord(fileData, modInfo))
         else:
             log.error(f"platform {platform} is not supported, cannot get versions infos")
-        return self.modVersions
+            modInfo = modRecords.ModInfo(modId, platform.lower(), modloader.lower(), "", "", None, "")
+        return modRecords.ModVersions(modInfo, versions)
     
+    def syncCurseforgeFiles(self, modId:str) -> list:
+        """get every file of a curseforge mod, newest first, kept in one compact cache file per mod,
+        the first sync fetches all the pages at once and the next ones only the files published since"""
+        filesCache = cacheDir/"modsVersions"/"curseforge"/f"{modId}.json"
+        cachedFiles = []
+        if filesCache.exists():
+            with open(filesCache, "r", encoding="utf-8") as f:
+                cachedFiles = json.load(f)["files"]
+            if self.cache.isFresh(filesCache):
+                return cachedFiles
+        shutil.rmtree(cacheDir/"modsVersions"/"curseforge"/modId, ignore_errors=True)  # cache of older versions, one file per version
+
+        files = self.fetchNewCurseforgeFiles(modId, cachedFiles) if cachedFiles else None
+        if files is None:  # no cache, or files were removed from curseforge since the last sync
+            files = self.fetchAllCurseforgeFiles(modId)
+            if files is None:
+                return cachedFiles  # offline, the outdated files are better than nothing
+        files.sort(key=lambda fileData: datetime.fromisoformat(fileData["fileDate"].replace("Z", "")), reverse=True)
+        filesCache.parent.mkdir(parents=True, exist_ok=True)
+        self.writeJson(filesCache, {"files": files}, compact=True)
+        self.cache.store(filesCache, "modsVersions")
+        return files
+
+    def getCompatibleCurseforgeFiles(self, modId:str, modloader:str, mcVersion:str) -> list:
+        """get the files of a curseforge mod for a modloader and minecraft version, newest first,
+        filtered by curseforge unless the full history is already in cache"""
+        if self.cache.isFresh(cacheDir/"modsVersions"/"curseforge"/f"{modId}.json"):
+            return self.syncCurseforgeFiles(modId)  # filtered afterwards, without any request
+        cachePath = cacheDir/"modsVersions"/"curseforge"/f"{modId}-{modloader}-{mcVersion}.json"
+        cachedFiles = []
+        if cachePath.exists():
+            with open(cachePath, "r", encoding="utf-8") as f:
+                cachedFiles = json.load(f)["files"]
+            if self.cache.isFresh(cachePath):
+                return cachedFiles
+        files = self.fetchAllCurseforgeFiles(modId, gameVersion=mcVersion, modLoaderType=self.curseforgeModloaders[modloader])
+        if files is None:
+            return cachedFiles
+        files.sort(key=lambda fileData: datetime.fromisoformat(fileData["fileDate"].replace("Z", "")), reverse=True)
+        cachePath.parent.mkdir(parents=True, exist_ok=True)
+        self.writeJson(cachePath, {"files": files}, compact=True)
+        self.cache.store(cachePath, "modsVersions")
+        return files
+
+    def fetchNewCurseforgeFiles(self, modId:str, cachedFiles:list) -> list:
+        """add the files published since the last sync to the cached ones, the pages being sorted newest first,
+        return None if the total does not match and everything must be fetched again"""
+        knownIds = {fileData["id"] for fileData in cachedFiles}
+        newFiles = []
+        index = 0
+        while True:
+            page = self.curseforgeRequest(f"mods/{modId}/files", pageSize=searchPageSize, index=index)
+            if page is None:
+                return None
+            unknownFiles = [fileData for fileData in page["data"] if fileData["id"] not in knownIds]
+            newFiles.extend(unknownFiles)
+            index += searchPageSize
+            if len(unknownFiles) < len(page["data"]) or index >= page["pagination"]["totalCount"]:
+                break
+        if len(newFiles) + len(cachedFiles) != page["pagination"]["totalCount"]:
+            log.info(f"files of curseforge mod {modId} changed since the last sync, fetching them all again")
+            return None
+        log.debug(f"found {len(newFiles)} new files for curseforge mod {modId}")
+        return newFiles + cachedFiles
+
+    def fetchAllCurseforgeFiles(self, modId:str, **filters) -> list:
+        """fetch every file of a curseforge mod matching the optional filters of the api (gameVersion, modLoaderType),
+        the first page gives the total count and the other pages are fetched at the same time"""
+        firstPage = self.curseforgeRequest(f"mods/{modId}/files", pageSize=searchPageSize, index=0, **filters)
+        if firstPage is None:
+            return None
+        total = min(firstPage["pagination"]["totalCount"], curseforgeMaxSearchResults)
+        indexes = range(searchPageSize, total, searchPageSize)
+        files = list(firstPage["data"])
+        if indexes:
+            with ThreadPoolExecutor(max_workers=min(len(indexes), self.connectionPoolSize), thread_name_prefix="curseforgeFiles") as executor:
+                pages = list(executor.map(lambda index: self.curseforgeRequest(f"mods/{modId}/files", pageSize=searchPageSize, index=index, **filters), indexes))
+            if any(page is None for page in pages):
+                log.error(f"unable to fetch all the files of curseforge mod {modId}")
+                return None
+            for page in pages:
+                files.extend(page["data"])
+        log.debug(f"fetched {len(files)} files of curseforge mod {modId} in {len(indexes) + 1} pages")
+        return list({fileData["id"]: fileData for fileData in files}.values())  # a file published during the sync can appear on two pages
+
+    def modrinthVersionToRecord(self, versionData:dict, modInfo:modRecords.ModInfo) -> modRecords.ModVersion:
+        """convert a modrinth version to the version record used by the app, only keeping the needed fields"""
+        # the rare dependencies without a project id can't be checked against the installed mods, they are ignored
+        dependencies = tuple((dependency["project_id"], dependency.get("version_id")) for dependency in versionData.get("dependencies", [])
+                             if dependency["dependency_type"] == "required" and dependency.get("project_id"))
+        incompatibilities = tuple(dependency["project_id"] for dependency in versionData.get("dependencies", [])
+                                  if dependency["dependency_type"] == "incompatible" and dependency.get("project_id"))
+        return modRecords.ModVersion(modInfo, str(versionData["id"]), versionData["version_number"], versionData["version_type"], tuple(versionData["game_versions"]),
+                                     versionData["files"][0]["url"], versionData["files"][0]["filename"], versionData["files"][0]["hashes"],
+                                     dependencies, incompatibilities)
+
+    def curseforgeVersionToRecord(self, fileData:dict, modInfo:modRecords.ModInfo) -> modRecords.ModVersion:
+        """convert a curseforge file to the version record used by the app, only keeping the needed fields"""
+        return modRecords.ModVersion(modInfo, str(fileData["id"]), fileData["displayName"], self.curseforgeReleases[fileData["releaseType"]],
+                                     tuple(mcVersion["gameVersion"] for mcVersion in fileData["sortableGameVersions"] if mcVersion["gameVersion"]),
+                                     fileData["downloadUrl"], fileData["fileName"],
+                                     {self.curseforgeHashAlgos[fileHash["algo"]]: fileHash["value"] for fileHash in fileData["hashes"] if fileHash["algo"] in self.curseforgeHashAlgos},
+                                     tuple((str(dependency["modId"]), None) for dependency in fileData.get("dependencies", []) if dependency["relationType"] == self.curseforgeRequiredDependency),
+                                     tuple(str(dependency["modId"]) for dependency in fileData.get("dependencies", []) if dependency["relationType"] == self.curseforgeIncompatibility))
+
+    def checkUpdates(self, profile:str) -> list:
+        """check every installed mod of a profile for a newer compatible version, asking each platform at once,
+        return a list of (installed version data, newest version data) for the outdated mods"""
+        properties = self.getProfile(profile)
+        modloader = properties["modloader"].lower()
+        mcVersion = properties["version"]
+        installedMods = [mod for mod in self.getInstalledMods(profile) if not isinstance(mod, str)]
+        updates = []
+
+        # modrinth finds the newest version of every mod from the hash of its installed file
+        modrinthMods = {}
+        for mod in installedMods:
+            if mod["platform"] == "modrinth":
+                sha1 = mod.get("hashes", {}).get("sha1")
+                if not sha1:
+                    modPath = profilesDir/profile/"modrinth"/mod["modId"]/mod["fileName"]
+                    if not modPath.exists():
+                        log.warning(f"file {modPath} of mod {mod['modName']} is missing, not checking it for updates")
+                        continue
+                    sha1 = self.hashFile(modPath)
+                modrinthMods[sha1] = mod
+        if modrinthMods:
+            newestVersions = self.modrinthPostRequest("version_files/update", {"hashes": list(modrinthMods), "algorithm": "sha1",
+                                                                                "loaders": [modloader], "game_versions": [mcVersion]})
+            tooUnstable = []  # mods whose newest version is less stable than the installed one
+            for sha1, versionData in (newestVersions or {}).items():
+                mod = modrinthMods.get(sha1)
+                if not mod:
+                    continue
+                if self.releaseStabilities.get(versionData["version_type"], 3) > self.releaseStabilities.get(mod.get("releaseType"), 3):
+                    tooUnstable.append(mod)
+                elif versionData["id"] != mod["versionId"]:
+                    updates.append((mod, self.modrinthVersionToRecord(versionData, modRecords.ModInfo.fromData(mod)).toData()))
+            if tooUnstable:  # never offer a beta or an alpha to someone using a release, look for the newest version stable enough
+                with ThreadPoolExecutor(max_workers=min(len(tooUnstable), self.connectionPoolSize), thread_name_prefix="updates") as executor:
+                    results = list(executor.map(lambda mod: self.modrinthRequest(f"project/{mod['modId']}/version", loaders=f'["{modloader}"]', game_versions=f'["{mcVersion}"]'), tooUnstable))
+                for mod, versionsData in zip(tooUnstable, results):
+                    maxStability = self.releaseStabilities.get(mod.get("releaseType"), 3)
+                    versionData = next((version for version in versionsData or [] if self.releaseStabilities.get(version["version_type"], 3) <= maxStability), None)
+                    if versionData and versionData["id"] != mod["versionId"]:
+                        updates.append((mod, self.modrinthVersionToRecord(versionData, modRecords.ModInfo.fromData(mod)).toData()))
+
+        # curseforge lists the latest file of each mod for every game version and modloader
+        curseforgeMods = {int(mod["modId"]): mod for mod in installedMods if mod["platform"] == "curseforge"}
+        if curseforgeMods:
+            modsData = self.curseforgePostRequest("mods", {"modIds": list(curseforgeMods)})
+            newestFiles = {}  # file id -> installed mod data
+            for modData in (modsData or {}).get("data", []):
+                mod = curseforgeMods.get(modData["id"])
+                if not mod:
+                    continue
+                # never offer a beta or an alpha to someone using a release, but offer a release to someone using a beta
+                maxStability = self.releaseStabilities.get(mod.get("releaseType"), 3)
+                candidates = [index["fileId"] for index in modData["latestFilesIndexes"]
+                              if index["gameVersion"] == mcVersion and index.get("modLoader") == self.curseforgeModloaders[modloader]
+                              and index.get("releaseType", 1) <= maxStability]
+                if candidates and max(candidates) != int(mod["versionId"]):
+                    newestFiles[max(candidates)] = mod
+            if newestFiles:
+                filesData = self.curseforgePostRequest("mods/files", {"fileIds": list(newestFiles)})
+                for fileData in (filesData or {}).get("data", []):
+                    mod = newestFiles.get(fileData["id"])
+                    if mod:
+                        updates.append((mod, self.curseforgeVersionToRecord(fileData, modRecords.ModInfo.fromData(mod)).toData()))
+        log.info(f"found {len(updates)} mod updates for profile {profile}")
+        return updates
+
     def removeCurrentMod(self, profile:str, modId:str, platform:str, auto:bool=False):
         """remove the currently selected mod"""
         currentModPath = profilesDir/profile/platform.lower()/modId
-        if os.path.exists(currentModPath):
+        if f"{platform.lower()}/{modId}" in self.loadManifest(profile)["mods"]:
             if not auto:
                 confirm = QMessageBox.question(None, lang("removeMod"), lang("removeModConfirm"), QMessageBox.Yes | QMessageBox.No)
                 if confirm == QMessageBox.No:
                     return -1  # removal cancelled
-            shutil.rmtree(currentModPath)
+            self.setManifestMod(profile, platform, modId)
+            shutil.rmtree(currentModPath, ignore_errors=True)
+            self.modStore.collect()
             log.info(f"Removed mod at {currentModPath}")
             if not auto:
                 QMessageBox.information(None, lang("success"), lang("modRemoved"))
         else:
             log.warning(f"Mod at {currentModPath} not found")
 
-    def installCurrentMod(self, profile:str, modId:str, platform:str, modVersionData:str):
-        """install the currently selected mod"""
-        #TODO: put a window during download
-        if modVersionData is None:
+    def installCurrentMod(self, profile:str, modId:str, platform:str, version:modRecords.ModVersion):
+        """queue the installation of the currently selected mod and of its missing dependencies in the download manager"""
+        if version is None:
             log.warning("No mod version data provided, cannot install the mod")
             QMessageBox.warning(None, lang("error"), lang("noVersionSelected"))
-            return
+            return -1
+        modVersionData = version.toData()
         currentModPath = profilesDir/profile/platform.lower()/modId
+        previousData = self.loadManifest(profile)["mods"].get(f"{platform.lower()}/{modId}")
         # check if the mod is already installed
-        if os.path.exists(currentModPath):
-            previousVersionId = json.load(open(currentModPath/"properties.json", "r", encoding="utf-8"))["versionId"]
-            if previousVersionId != modVersionData["versionId"]:  # if the mod is already installed but with a different version
+        if previousData is not None:
+            if str(previousData["versionId"]) != str(modVersionData["versionId"]):  # if the mod is already installed but with a different version
                 confirm = QMessageBox.question(None, lang("updateMod"), lang("updateModConfirm"), QMessageBox.Yes | QMessageBox.No)
                 if confirm == QMessageBox.No:
                     return -1
                 log.warning(f"Mod at {currentModPath} already installed, updating")
-                self.removeCurrentMod(profile, modId, platform, auto=True)
             else:
-                return # the mod is already installed with the same version
-        QMessageBox.information(None, lang("success"), lang("modInstalled"))
-        # install the mod
-        currentModPath.mkdir(parents=True, exist_ok=True)
-        with open(currentModPath/"properties.json", "w", encoding="utf-8") as f:
-            json.dump(modVersionData, f, indent=4)
-        with open(currentModPath/modVersionData["fileName"], "wb") as f:
-            f.write(requests.get(modVersionData["downloadUrl"]).content)
-        log.info(f"Installed mod '{modVersionData['modName']}' version '{modVersionData['versionName']}' in profile {profile}")
+                return -1 # the mod is already installed with the same version
+
+        Qt.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            dependencies, problems = self.resolveDependencies(profile, version)
+        finally:
+            Qt.QApplication.restoreOverrideCursor()
+        if dependencies or problems:
+            text = ""
+            if dependencies:
+                text += f"{lang('dependenciesFound')}\n" + "\n".join(f"{dependency.mod.modName} ({dependency.versionName})" for dependency in dependencies) + "\n\n"
+            if problems:
+                text += f"{lang('dependencyProblems')}\n" + "\n".join(problems) + "\n\n"
+            text += lang("installDependenciesConfirm")
+            confirm = QMessageBox.question(None, lang("dependencies"), text, QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if confirm == QMessageBox.Cancel:
+                return -1
+            if confirm == QMessageBox.No:
+                dependencies = []
+        self.queueModInstall(profile, modVersionData, previousData)
+        for dependency in dependencies:  # downloaded in parallel with the mod
+            self.queueModInstall(profile, dependency.toData())
+
+    def resolveDependencies(self, profile:str, rootVersion:modRecords.ModVersion) -> tuple:
+        """walk the required dependencies of a version level by level, each level being fetched with bulk requests on every platform at once,
+        return the versions to install with it and the problems found (dependencies without compatible version, different versions required, incompatible mods)"""
+        properties = self.getProfile(profile)
+        modloader, mcVersion = properties["modloader"].lower(), properties["version"]
+        installed = self.loadManifest(profile)["mods"]
+        rootKey = f"{rootVersion.mod.platform}/{rootVersion.mod.modId}"
+        resolved = {rootKey: rootVersion}
+        parents = {rootKey: None}  # mod key -> key of the mod which first required it
+        names = {self.searchKey(mod["modName"]): key for key, mod in installed.items()}  # to recognize a mod installed from the other platform
+        names[self.searchKey(rootVersion.mod.modName)] = rootKey
+        problems = []
+        level = [rootVersion]
+        while level:
+            wanted = {platform: {} for platform in availablePlatforms}  # platform -> mod id -> pinned version id or None
+            wantedBy = {}  # mod key -> key of the mod requiring it
+            pinConflicts = []  # (mod key, key of the mod requiring another version of it than the first one)
+            for version in level:
+                versionKey = f"{version.mod.platform}/{version.mod.modId}"
+                for modId, versionId in version.dependencies:
+                    key = f"{version.mod.platform}/{modId}"
+                    if key in resolved:
+                        ancestor = versionKey
+                        while ancestor is not None and ancestor != key:
+                            ancestor = parents[ancestor]
+                        if ancestor == key:
+                            log.info(f"dependency cycle: {versionKey} requires {key} which already requires it")
+                        if versionId and str(versionId) != str(resolved[key].versionId):
+                            problems.append(f"{lang('dependencyVersionConflict')}: {resolved[key].mod.modName} ({version.mod.modName} / {resolved[key].versionName})")
+                        continue
+                    if key in installed:
+                        if versionId and str(versionId) != str(installed[key]["versionId"]):
+                            problems.append(f"{lang('dependencyVersionConflict')}: {installed[key]['modName']} ({version.mod.modName} / {installed[key].get('versionName', installed[key]['versionId'])})")
+                        continue
+                    if key in wantedBy:
+                        pinned = wanted[version.mod.platform][modId]
+                        if versionId and pinned and str(versionId) != str(pinned):
+                            pinConflicts.append((key, versionKey))
+                        elif versionId and not pinned:  # the pinned version also satisfies the mod requiring any version
+                            wanted[version.mod.platform][modId] = versionId
+                            wantedBy[key] = versionKey
+                        continue
+                    wanted[version.mod.platform][modId] = versionId
+                    wantedBy[key] = versionKey
+            if not wantedBy:
+                break
+
+            with ThreadPoolExecutor(max_workers=len(availablePlatforms), thread_name_prefix="dependencies") as executor:
+                modrinthFuture = executor.submit(self.fetchModrinthDependencies, wanted["modrinth"], modloader, mcVersion)
+                curseforgeFuture = executor.submit(self.fetchCurseforgeDependencies, list(wanted["curseforge"]), modloader, mcVersion)
+            found, modNames, unfitPins = {}, {}, set()
+            for platform, future in (("modrinth", modrinthFuture), ("curseforge", curseforgeFuture)):
+                versions, platformNames, platformUnfitPins = future.result()
+                found.update({f"{platform}/{modId}": version for modId, version in versions.items()})
+                modNames.update({f"{platform}/{modId}": name for modId, name in platformNames.items()})
+                unfitPins.update(f"{platform}/{modId}" for modId in platformUnfitPins)
+            for key, requirerKey in pinConflicts:
+                problems.append(f"{lang('dependencyVersionConflict')}: {modNames.get(key, key)} ({resolved[wantedBy[key]].mod.modName} / {resolved[requirerKey].mod.modName})")
+
+            level = []
+            for key, version in found.items():
+                if key in unfitPins:  # the required version does not run on the profile, another one may not work with the mod requiring it
+                    problems.append(f"{lang('dependencyVersionConflict')}: {modNames.get(key, key)} ({resolved[wantedBy[key]].mod.modName} / {modloader} {mcVersion})")
+                    continue
+                if version is None:
+                    problems.append(f"{lang('dependencyNotFound')}: {modNames.get(key, key)} ({resolved[wantedBy[key]].mod.modName})")
+                    continue
+                name = self.searchKey(version.mod.modName)
+                if name in names:  # the same mod is already installed or required from the other platform
+                    continue
+                resolved[key] = version
+                parents[key] = wantedBy[key]
+                names[name] = key
+                level.append(version)
+
+        # incompatibilities are only known for the mods being installed
+        modNames = {key: mod["modName"] for key, mod in installed.items()}
+        modNames.update({key: version.mod.modName for key, version in resolved.items()})
+        for key, version in resolved.items():
+            for modId in version.incompatibilities:
+                otherKey = f"{version.mod.platform}/{modId}"
+                if otherKey in modNames:
+                    problems.append(f"{lang('dependencyConflict')}: {version.mod.modName} / {modNames[otherKey]}")
+        log.info(f"resolved {len(resolved) - 1} dependencies for {rootKey} with {len(problems)} problems")
+        return [version for key, version in resolved.items() if key != rootKey], problems
+
+    def fetchModrinthDependencies(self, dependencies:dict, modloader:str, mcVersion:str) -> tuple:
+        """get a compatible version for each modrinth project of a dict project id -> pinned version id or None,
+        the pinned versions and the projects are fetched in bulk and the other versions at the same time,
+        return project id -> version record or None, project id -> project name, and the projects whose pinned version does not fit the profile"""
+        if not dependencies:
+            return {}, {}, set()
+        found = {}  # project id -> version data
+        pinnedIds = [versionId for versionId in dependencies.values() if versionId]
+        if pinnedIds:
+            for versionData in self.modrinthRequest("versions", ids=json.dumps(pinnedIds)) or []:
+                if modloader in versionData["loaders"] and mcVersion in versionData["game_versions"]:
+                    found[versionData["project_id"]] = versionData
+        unfitPins = {projectId for projectId, versionId in dependencies.items() if versionId and projectId not in found}
+        missing = [projectId for projectId, versionId in dependencies.items() if not versionId]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), self.connectionPoolSize), thread_name_prefix="dependencies") as executor:
+                results = list(executor.map(lambda projectId: self.modrinthRequest(f"project/{projectId}/version", loaders=f'["{modloader}"]', game_versions=f'["{mcVersion}"]'), missing))
+            for projectId, versionsData in zip(missing, results):
+                if versionsData:  # the newest release, or the newest beta or alpha if there is none, the versions are sorted newest first
+                    found[projectId] = min(versionsData, key=lambda versionData: self.releaseStabilities.get(versionData["version_type"], 3))
+        modInfos = {}  # every project, to name the ones without compatible version too
+        for project in self.modrinthRequest("projects", ids=json.dumps(list(dependencies))) or []:
+            modInfos[project["id"]] = modRecords.ModInfo(project["id"], "modrinth", modloader, project["title"], "", project["icon_url"], f"https://modrinth.com/mod/{project['slug']}")
+        return ({projectId: self.modrinthVersionToRecord(found[projectId], modInfos[projectId]) if projectId in found and projectId in modInfos else None
+                 for projectId in dependencies},
+                {projectId: modInfo.modName for projectId, modInfo in modInfos.items()},
+                unfitPins)
+
+    def fetchCurseforgeDependencies(self, modIds:list, modloader:str, mcVersion:str) -> tuple:
+        """get the newest compatible release of each curseforge mod, or beta or alpha if there is none, with one bulk request for the mods and one for the files,
+        return mod id -> version record or None, mod id -> mod name, and no pinned versions as curseforge has none"""
+        if not modIds:
+            return {}, {}, set()
+        found = {modId: None for modId in modIds}
+        names = {}
+        modsData = self.curseforgePostRequest("mods", {"modIds": [int(modId) for modId in modIds]})
+        newestFiles = {}  # file id -> mod infos
+        for modData in (modsData or {}).get("data", []):
+            names[str(modData["id"])] = modData["name"]
+            candidates = [(index.get("releaseType", 1), -index["fileId"]) for index in modData["latestFilesIndexes"]
+                          if index["gameVersion"] == mcVersion and index.get("modLoader") == self.curseforgeModloaders[modloader]]
+            if candidates:
+                authors = ", ".join([author["name"] for author in modData["authors"]])
+                iconUrl = modData["logo"]["thumbnailUrl"] if modData.get("logo") else None
+                newestFiles[-min(candidates)[1]] = modRecords.ModInfo(str(modData["id"]), "curseforge", modloader, modData["name"], authors, iconUrl, modData["links"]["websiteUrl"])
+        if newestFiles:
+            filesData = self.curseforgePostRequest("mods/files", {"fileIds": list(newestFiles)})
+            for fileData in (filesData or {}).get("data", []):
+                modInfo = newestFiles.get(fileData["id"])
+                if modInfo and modInfo.modId in found:
+                    found[modInfo.modId] = self.curseforgeVersionToRecord(fileData, modInfo)
+        return found, names, set()
+
+    def queueModInstall(self, profile:str, modVersionData:dict, previousData:dict=None) -> int:
+        """download a mod version in the background, the previous version is only replaced once the new file is complete and verified"""
+        currentModPath = profilesDir/profile/modVersionData["platform"].lower()/modVersionData["modId"]
+        def finishInstall(success:bool):
+            if not success:
+                return
+            if previousData is not None and previousData["fileName"] != modVersionData["fileName"]:
+                (currentModPath/previousData["fileName"]).unlink(missing_ok=True)
+            self.setManifestMod(profile, modVersionData["platform"], modVersionData["modId"],
+                                {**modVersionData, "fileSize": (currentModPath/modVersionData["fileName"]).stat().st_size})
+            log.info(f"Installed mod '{modVersionData['modName']}' version '{modVersionData['versionName']}' in profile {profile}")
+        return self.downloadManager.submit(modVersionData["downloadUrl"], currentModPath/modVersionData["fileName"], modVersionData.get("hashes"), finishInstall)
+
+    def hashFile(self, path:Path, algorithm:str="sha1") -> str:
+        """compute the hash of a file without loading it whole in memory"""
+        hasher = hashlib.new(algorithm)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024*1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def downloadFile(self, url:str, destination:Path, hashes:dict=None, progress=None, limiter:downloadManager.BandwidthLimiter=None) -> bool:
+        """stream a file into a partial file, resuming it if a previous attempt was interrupted,
+        then check it against the strongest given hash and move it in place, progress(done, total) is called while downloading"""
+        if hashes and self.modStore.linkTo(hashes.get("sha1"), destination):  # the same file is already used by a profile
+            log.info(f"placed {destination.name} from the store without downloading it")
+            return True
+        algorithm = next((algo for algo in ("sha512", "sha1", "md5") if hashes and hashes.get(algo)), None)
+        downloadsDir.mkdir(parents=True, exist_ok=True)
+        tempPath = downloadsDir/f"{hashlib.sha1(f'{url}|{destination}'.encode()).hexdigest()}.part"  # stable between attempts, unique per destination
+        resumeFrom = tempPath.stat().st_size if tempPath.exists() else 0
+        try:
+            with self.httpGet(url, stream=True, headers={"Range": f"bytes={resumeFrom}-"} if resumeFrom else {}) as response:
+                if response.status_code != 416:  # 416 means the partial file is already complete
+                    response.raise_for_status()
+                    if response.status_code != 206:  # the server ignored the range, start over
+                        resumeFrom = 0
+                    else:
+                        log.info(f"resuming download of {destination.name} from byte {resumeFrom}")
+                    done = resumeFrom
+                    total = resumeFrom + int(response.headers.get("Content-Length", 0))
+                    with open(tempPath, "ab" if resumeFrom else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=64*1024):
+                            if limiter:
+                                limiter.consume(len(chunk))
+                            f.write(chunk)
+                            done += len(chunk)
+                            if progress:
+                                progress(done, max(total, done))
+        except (requests.exceptions.RequestException, OSError) as e:
+            log.error(f"error while downloading {url} to {destination}, keeping the partial file to resume later: {e}")
+            return False
+        if algorithm and self.hashFile(tempPath, algorithm) != hashes[algorithm].lower():
+            log.error(f"{algorithm} hash mismatch for {destination.name}, the file is corrupted")
+            tempPath.unlink(missing_ok=True)
+            return False
+        if not algorithm:
+            log.warning(f"no hash available to verify {destination.name}")
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tempPath, destination)  # atomic, and replaces the link instead of writing into a file shared with the store
+        self.modStore.add(destination, hashes["sha1"] if hashes and hashes.get("sha1") else self.hashFile(destination))
+        return True
+
+    def adoptProfileFiles(self, profile:str) -> dict:
+        """put the mod files of a profile in the store, replacing the ones already stored with links to them, return path -> sha1"""
+        fileHashes = {}
+        for modFile in (profilesDir/profile).glob("*/**/*.jar"):
+            sha1 = fileHashes[modFile] = self.hashFile(modFile)
+            if not self.modStore.linkTo(sha1, modFile):
+                self.modStore.add(modFile, sha1)
+        return fileHashes
     
     def getInstalledMods(self, profile:str) -> list:
         """get a list of the data of all the installed mods in a profile, sorted by name then the custom jar mods"""
@@ -334,12 +997,7 @@ class Methods():
         currentProfileDir = profilesDir/profile
         installedMods = []
         if currentProfileDir.exists():
-            for platform in availablePlatforms:
-                if (currentProfileDir/platform).exists():
-                    for mod in glob.glob(str(currentProfileDir/platform/"*")):
-                        if os.path.isdir(mod):
-                            with open(Path(mod)/"properties.json", "r", encoding="utf-8") as f:
-                                installedMods.append(json.load(f))
+            installedMods = list(self.loadManifest(profile)["mods"].values())
         else:
             log.error(f"Profile {profile} not found")
         installedMods.sort(key=lambda mod: mod["modName"])
@@ -354,6 +1012,8 @@ class Methods():
         profilePath = profilesDir/profile
         if profilePath.exists():
             shutil.rmtree(profilePath)
+            self.invalidateProfiles()
+            self.modStore.collect()
             log.info(f"Removed profile {profile}")
             QMessageBox.information(None, lang("success"), lang("profileRemoved"))
         else:
@@ -372,23 +1032,41 @@ class Methods():
             confirm = QMessageBox.question(None, lang("applyProfileTitle"), lang("applyProfileConfirm"), QMessageBox.Yes | QMessageBox.No)
             if confirm == QMessageBox.No:
                 return -1
-        for previousMod in glob.glob(str(self.minecraftModsPath/"*")):
-            if os.path.isfile(previousMod):
-                os.remove(previousMod)
-        for platform in availablePlatforms:
-            if (profilePath/platform).exists():
-                for mod in glob.glob(str(profilePath/platform/"*")):
-                    if os.path.isdir(mod):
-                        with open(Path(mod)/"properties.json", "r", encoding="utf-8") as f:
-                            modData = json.load(f)
-                        shutil.copyfile(Path(mod)/modData["fileName"], self.minecraftModsPath/modData["fileName"])
+        # list the files the mods folder should contain, with their sha1 when known
+        wantedMods = {}  # file name -> (path in the profile, sha1 or None)
+        for modKey, modData in self.loadManifest(profile)["mods"].items():
+            wantedMods[modData["fileName"]] = (profilePath/modKey/modData["fileName"], modData.get("hashes", {}).get("sha1"))
         for jarMod in glob.glob(str(profilePath/"jar"/"*")):
             if os.path.isfile(jarMod):
-                shutil.copyfile(jarMod, self.minecraftModsPath/Path(jarMod).name)
-        log.info(f"Applied profile {profile}")
+                wantedMods[Path(jarMod).name] = (Path(jarMod), None)
+        # only remove or replace the files that differ, then add the missing ones
+        kept = removed = 0
+        for previousMod in glob.glob(str(self.minecraftModsPath/"*")):
+            previousMod = Path(previousMod)
+            if not previousMod.is_file():
+                continue
+            if previousMod.name in wantedMods and self.isSameFile(previousMod, *wantedMods[previousMod.name]):
+                del wantedMods[previousMod.name]
+                kept += 1
+            else:
+                os.remove(previousMod)
+                removed += 1
+        for fileName, (modPath, _) in wantedMods.items():
+            modStore.placeFile(modPath, self.minecraftModsPath/fileName)
+        log.info(f"Applied profile {profile}: kept {kept} mods, removed {removed} and placed {len(wantedMods)}")
         if not auto:
             QMessageBox.information(None, lang("success"), lang("profileApplied"))
     
+    def isSameFile(self, path:Path, otherPath:Path, sha1:str=None) -> bool:
+        """check if two files have the same content, comparing the cheap properties first"""
+        if not otherPath.exists():
+            return False
+        if os.path.samefile(path, otherPath):  # hardlinks of the same file
+            return True
+        if path.stat().st_size != otherPath.stat().st_size:
+            return False
+        return self.hashFile(path) == (sha1.lower() if sha1 else self.hashFile(otherPath))
+    
     def installJarMod(self, profile:str, modPath:Path):
         """install a jar mod to the profile"""
         jarFolder = profilesDir/profile/"jar"
@@ -409,7 +1087,10 @@ class Methods():
             else:
                 log.info(f"Cancelled installation of jar mod {filename} in profile {profile}")
                 return -1
-        shutil.copyfile(modPath, jarFolder/filename)
+        sha1 = self.hashFile(modPath)
+        if not self.modStore.linkTo(sha1, jarFolder/filename):
+            shutil.copyfile(modPath, jarFolder/filename)
+            self.modStore.add(jarFolder/filename, sha1)
         log.info(f"Installed jar mod {filename} in profile {profile}")
     
     def renameProfile(self, currentName:str, newName:str):
@@ -425,6 +1106,8 @@ class Methods():
         with open(currentProfilePath/"properties.json", "w", encoding="utf-8") as f:
             json.dump(oldProperties, f, indent=4)
         shutil.move(currentProfilePath, newProfilePath)
+        self.modStore.moveReferences(currentProfilePath, newProfilePath)
+        self.invalidateProfiles()
         log.info(f"Renamed profile {currentName} to {newName}")
         QMessageBox.information(None, lang("success"), lang("profileRenamed"))
     
@@ -437,10 +1120,9 @@ class Methods():
         if not profilePath.exists():
             log.error(f"Profile {profile} not found")
             return
-        with open(profilePath/"properties.json", "r", encoding="utf-8") as f:
-            properties = json.load(f)
-            modloader = properties["modloader"].lower()
-            version = properties["version"]
+        properties = self.getProfile(profile)
+        modloader = properties["modloader"].lower()
+        version = properties["version"]
 
         bestLoaderVersion = self.getBestLoaderVersion(modloader, version)
         if bestLoaderVersion == -1:
@@ -462,7 +1144,9 @@ class Methods():
         }  #TODO: implement login
         
         log.info("saving previous mods")
-        self.savePreviousMods()
+        if not self.savePreviousMods():
+            QMessageBox.critical(None, lang("error"), lang("previousModsLocked"))
+            return
         log.info(f"applying profile {profile}")
         self.applyProfile(profile, auto=True)
         log.info(f"Launching game in offline mode with profile {profile}")
@@ -486,37 +1170,56 @@ class Methods():
         self.gameRunning = False
         log.info("game closed, restored previous mods")
     
-    def savePreviousMods(self):
-        """save the previous mods to restore them after the game is closed"""
-        modsStorage = cacheDir/"previousMods"
-        modsStorage.mkdir(parents=True, exist_ok=True)
+    def savePreviousMods(self) -> bool:
+        """move the previous mods aside to restore them after the game is closed, keeping a journal to recover from a crash,
+        return False if the mods of the last launch could not be restored yet"""
+        if launchJournalFile.exists():  # the last restoration did not finish
+            self.restorePreviousMods()
+            if launchJournalFile.exists():  # saving now would mix the mods of the last profile with the previous ones
+                log.error("the previous mods of the last launch could not be restored, not launching the game")
+                return False
+        backupPath = self.minecraftAppdataPath/"mmmPreviousMods"  # next to the mods folder so moving files is only a rename
+        backupPath.mkdir(parents=True, exist_ok=True)
+        journal = {"state": "saving", "modsPath": str(self.minecraftModsPath), "backupPath": str(backupPath)}
+        self.writeJson(launchJournalFile, journal)
         for mod in glob.glob(str(self.minecraftModsPath/"*")):
             if os.path.isfile(mod):
-                shutil.copyfile(mod, modsStorage/Path(mod).name)
-                os.remove(mod)
-        
+                shutil.move(mod, backupPath/Path(mod).name)
+        journal["state"] = "saved"  # from now on, the files in the mods folder belong to the profile
+        self.writeJson(launchJournalFile, journal)
+        return True
 
     def restorePreviousMods(self):
-        """restore the previous mods after the game is closed"""
-        modsStorage = cacheDir/"previousMods"
-        if modsStorage.exists():
-            # delete the current mods
-            while True:
-                try:
-                    for currentMod in glob.glob(str(self.minecraftModsPath/"*")):
-                        if os.path.isfile(currentMod):
-                            os.remove(currentMod)
-                    break
-                except PermissionError:
-                    log.warning("Permission error while deleting current mods, retrying")
-                    time.sleep(0.1)
-            # restore the previous mods
-            for mod in glob.glob(str(modsStorage/"*")):
-                if os.path.isfile(mod):
-                    shutil.copyfile(mod, self.minecraftModsPath/Path(mod).name)
-            shutil.rmtree(modsStorage)
-        else:
+        """restore the previous mods after the game is closed, or after a crash using the journal"""
+        if not launchJournalFile.exists():
             log.error("No previous mods found to restore")
+            return
+        with open(launchJournalFile, "r", encoding="utf-8") as f:
+            journal = json.load(f)
+        modsPath = Path(journal["modsPath"])
+        backupPath = Path(journal["backupPath"])
+        if journal["state"] == "saved":  # delete the profile mods, the files left when interrupted while saving are the previous ones
+            for currentMod in glob.glob(str(modsPath/"*")):
+                if os.path.isfile(currentMod) and not self.removeFile(Path(currentMod)):
+                    log.error(f"unable to remove {currentMod}, previous mods will be restored on next start")
+                    return
+        modsPath.mkdir(parents=True, exist_ok=True)
+        for mod in glob.glob(str(backupPath/"*")):
+            if os.path.isfile(mod):
+                shutil.move(mod, modsPath/Path(mod).name)
+        shutil.rmtree(backupPath, ignore_errors=True)
+        launchJournalFile.unlink()
+
+    def removeFile(self, path:Path, attempts:int=50) -> bool:
+        """remove a file, retrying for a while if it is still locked by a closing process"""
+        for _ in range(attempts):
+            try:
+                path.unlink(missing_ok=True)
+                return True
+            except PermissionError:
+                log.warning(f"Permission error while deleting {path}, retrying")
+                time.sleep(0.1)
+        return False
 
     def getBestLoaderVersion(self, modloader:str, mcVersion:str) -> str:
         """get the latest version of a modloader for a minecraft version from the installed versions"""
@@ -585,6 +1288,7 @@ class Methods():
         if not Path(importPath).exists():
             log.error(f"Import file {importPath} not found")
             return -1
+        self.invalidateProfiles()
         tempProfilePath = cacheDir/"tempProfile"
         tempProfilePath.mkdir(parents=True, exist_ok=True)
         shutil.unpack_archive(importPath, extract_dir=str(tempProfilePath))
@@ -594,6 +1298,8 @@ class Methods():
             if confirm == QMessageBox.Yes:
                 shutil.rmtree(profilesDir/profileName)
                 shutil.move(tempProfilePath/profileName, profilesDir)
+                self.modStore.collect()
+                self.adoptProfileFiles(profileName)
             elif confirm == QMessageBox.No:
                 newName = f"{profileName}_1"
                 num = 1
@@ -606,17 +1312,62 @@ class Methods():
                 oldData["name"] = newName
                 with open(profilesDir/newName/"properties.json", "w", encoding="utf-8") as f:
                     json.dump(oldData, f, indent=4)
+                self.adoptProfileFiles(newName)
             else:
                 log.info(f"Cancelled import of profile {profileName}")
                 return -1
         else:
             shutil.move(tempProfilePath/profileName, profilesDir)
+            self.adoptProfileFiles(profileName)
     
-    def getInstalledVersion(self, profile:str, modId:str, platform:str):
-        """get the installed version of a mod if installed, else return None"""
-        modPath = profilesDir/profile/platform.lower()/modId
-        if modPath.exists():
-            with open(modPath/"properties.json", "r", encoding="utf-8") as f:
-                return json.load(f)["versionName"]
-        else:
-            return None
+    def getInstalledVersionId(self, profile:str, modId:str, platform:str) -> str:
+        """get the id of the installed version of a mod if installed, else return None"""
+        modData = self.loadManifest(profile)["mods"].get(f"{platform.lower()}/{modId}")
+        return str(modData["versionId"]) if modData else None
+
+
+class IconFetcher(QtCore.QObject):
+    iconReady = QtCore.pyqtSignal(str, str)  # platform and mod id of the downloaded icon
+    def __init__(self, methods:Methods, maxWorkers:int):
+        """a service downloading mod icons on a fixed pool of threads, never downloading the same icon twice at once"""
+        super().__init__()
+        self.methods = methods
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="iconFetcher")
+        self.pending = {}  # (platform, id) -> [future, set of the groups waiting for it]
+        self.lock = threading.Lock()
+
+    def fetch(self, platform:str, id:str, iconUrl:str, group:str):
+        """queue the download of an icon for a group of widgets, iconReady is emitted on the GUI thread once it's in cache"""
+        if not iconUrl:
+            return
+        key = (platform.lower(), id)
+        if self.methods.cache.isFresh(cacheDir/"modIcons"/key[0]/f"{id}.png"):
+            return
+        with self.lock:
+            if key in self.pending:  # already queued or downloading, just wait for it
+                self.pending[key][1].add(group)
+                return
+            future = self.executor.submit(self.download, key, iconUrl)
+            self.pending[key] = [future, {group}]
+
+    def download(self, key:tuple, iconUrl:str):
+        """download an icon on a worker thread and notify the GUI"""
+        try:
+            downloaded = self.methods.downloadIcon(*key, iconUrl)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        if downloaded:
+            self.iconReady.emit(*key)
+
+    def cancel(self, group:str):
+        """cancel the pending downloads that were only requested by this group"""
+        with self.lock:
+            for key, (future, groups) in list(self.pending.items()):
+                groups.discard(group)
+                if not groups and future.cancel():  # only works if the download did not start yet
+                    del self.pending[key]
+
+
+class BackendSignals(QtCore.QObject):
+    projectRefreshed = QtCore.pyqtSignal(str, str)  # platform and mod id whose cached data changed after a background revalidation
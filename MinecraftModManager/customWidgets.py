@@ -1,4 +1,4 @@
-import backendMethods
+import backendMethods, modRecords  # local modules
 from usefulVariables import *  # local variables
 import PyQt5.QtWidgets as Qt
 from PyQt5 import QtGui, QtCore
@@ -111,7 +111,8 @@ class ModSelect(Qt.QFrame):
             self.modId = modData["modId"]
             self.fileName = modData["fileName"]
             self.version = modData["versionName"]
-            self.iconPath = cacheDir/"modIcons"/modData["platform"].lower()/f"{self.modId}.png"
+            self.platform = modData["platform"].lower()
+            self.iconPath = cacheDir/"modIcons"/self.platform/f"{self.modId}.png"
             self.versionId = modData["versionId"]
 
         # mod icon
@@ -191,148 +192,312 @@ class ModSelect(Qt.QFrame):
             self.setFrameShape(Qt.QFrame.NoFrame)
             self.isSelected = False
 
-class SearchModSelect(Qt.QFrame):
-    wasSelected = QtCore.pyqtSignal(dict)
-    def __init__(self, modData:dict):
-        """a button to select the mod to view and install"""
+class SearchResultsModel(QtCore.QAbstractListModel):
+    moreRequested = QtCore.pyqtSignal()  # the view scrolled to the end and the next page of results should be fetched
+    iconRequested = QtCore.pyqtSignal(str, str, object)  # platform, mod id and icon url of a displayed mod without icon
+    def __init__(self):
+        """the list of the mods found by a search, filled page by page as the user scrolls"""
         super().__init__()
-        self.mainLayout = Qt.QHBoxLayout()
-        self.mainLayout.setAlignment(QtCore.Qt.AlignLeft)
-        self.setLayout(self.mainLayout)
-
-        self.modData = modData
-        self.name = modData["name"]
-        self.author = modData["author"]
-        self.iconPath = modData["icon"]
-        self.modId = modData["id"]
-        self.platform = modData["platform"]
-        self.isSelected = False
-
-        # mod icon
-        self.iconLabel = Qt.QLabel()
-        self.updateIcon()
-        self.mainLayout.addWidget(self.iconLabel)
-
-        # widget containing the informations about the mod
-        self.textWidget = Qt.QWidget()
-        self.textLayout = Qt.QVBoxLayout()
-        self.textWidget.setLayout(self.textLayout)
-        self.mainLayout.addWidget(self.textWidget, 1)  # the 1 makes the widget expandable
-
-        self.nameLabel = Qt.QLabel(self.name)
-        self.nameLabel.setFont(Fonts.smallTitleFont)
-        self.nameLabel.setWordWrap(True)
-        self.textLayout.addWidget(self.nameLabel)
-
-        self.authorLabel = Qt.QLabel(f"by {self.author}")
-        self.authorLabel.setFont(Fonts.textFont)
-        self.authorLabel.setWordWrap(True)
-        self.textLayout.addWidget(self.authorLabel)
-
-        # mouse tracking
-        self.setMouseTracking(True)
-        self.enterEvent = self.onEnter
-        self.leaveEvent = self.onLeave
-
-        self.mousePressEvent = self.onMousePress
-    
-    def updateIcon(self):
-        """update the icon from the iconPath if it exists"""
-        if os.path.exists(self.iconPath):
-            self.iconLabel.setPixmap(QtGui.QPixmap(str(self.iconPath)).scaled(64, 64))
-        else:
-            self.iconLabel.setPixmap(QtGui.QPixmap(str(iconsAssetsDir/"noMedia.png")).scaled(64, 64))
+        self.mods = []
+        self.rows = {}  # (platform, mod id) -> row, also for the other platforms of merged mods
+        self.requestedIcons = set()
+        self.hasMore = False
+        self.fetching = False
+        self.nextPage = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.mods)
+
+    def data(self, index:QtCore.QModelIndex, role:int=QtCore.Qt.DisplayRole):
+        """give the name, the icon or the whole data of a mod"""
+        if not index.isValid():
+            return None
+        mod = self.mods[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return mod["name"]
+        elif role == QtCore.Qt.DecorationRole:
+            return self.getIcon(mod)
+        elif role == QtCore.Qt.UserRole:
+            return mod
+        return None
 
-    def onMousePress(self, event):
-        if not self.isSelected:
-            self.setSelected(True)
-        event.accept()
+    def getIcon(self, mod:dict) -> QtGui.QPixmap:
+        """get the scaled icon of a mod from the pixmap cache, which keeps the memory bounded, and ask for its download if missing"""
+        key = f"{mod['platform']}/{mod['id']}"
+        pixmap = QtGui.QPixmapCache.find(key)
+        if pixmap is None or pixmap.isNull():
+            if os.path.exists(mod["icon"]):
+                pixmap = QtGui.QPixmap(str(mod["icon"])).scaled(64, 64)
+                QtGui.QPixmapCache.insert(key, pixmap)
+            else:
+                if key not in self.requestedIcons:
+                    self.requestedIcons.add(key)
+                    self.iconRequested.emit(mod["platform"], mod["id"], mod["iconUrl"])
+                pixmap = QtGui.QPixmapCache.find("noMedia")
+                if pixmap is None or pixmap.isNull():
+                    pixmap = QtGui.QPixmap(str(iconsAssetsDir/"noMedia.png")).scaled(64, 64)
+                    QtGui.QPixmapCache.insert("noMedia", pixmap)
+        return pixmap
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and self.hasMore and not self.fetching
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """called by the view when the last rows are shown"""
+        if self.canFetchMore(parent):
+            self.fetching = True
+            self.moreRequested.emit()
+
+    def setMods(self, mods:list, hasMore:bool):
+        """replace the results with the first page of a new search"""
+        self.beginResetModel()
+        self.mods = []
+        self.rows = {}
+        self.requestedIcons = set()
+        self.nextPage = 0
+        self.endResetModel()
+        self.addMods(mods, hasMore)
+
+    def addMods(self, mods:list, hasMore:bool):
+        """add a page of results, skipping the mods already shown because the results moved between two pages"""
+        newMods = [mod for mod in mods if (mod["platform"], mod["id"]) not in self.rows]
+        self.hasMore = hasMore
+        self.fetching = False
+        self.nextPage += 1
+        if not newMods:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.mods), len(self.mods) + len(newMods) - 1)
+        for mod in newMods:
+            for platform, otherMod in [(mod["platform"], mod)] + list(mod.get("alternatives", {}).items()):
+                self.rows[(platform, otherMod["id"])] = len(self.mods)
+            self.mods.append(mod)
+        self.endInsertRows()
+
+    def clear(self):
+        """remove every result"""
+        self.setMods([], False)
+        self.nextPage = 0
+
+    def updateIcon(self, platform:str, modId:str):
+        """repaint the row of a mod whose icon was downloaded"""
+        QtGui.QPixmapCache.remove(f"{platform}/{modId}")
+        row = self.rows.get((platform, modId))
+        if row is not None and self.mods[row]["platform"] == platform:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+class SearchResultDelegate(Qt.QStyledItemDelegate):
+    def __init__(self):
+        """paints the search results, only the visible rows are ever painted"""
+        super().__init__()
+        self.nameMetrics = QtGui.QFontMetrics(Fonts.smallTitleFont)
+        self.textMetrics = QtGui.QFontMetrics(Fonts.textFont)
+
+    def sizeHint(self, option:Qt.QStyleOptionViewItem, index:QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(option.rect.width(), 84)
+
+    def paint(self, painter:QtGui.QPainter, option:Qt.QStyleOptionViewItem, index:QtCore.QModelIndex):
+        """draw the icon, name, author and platforms of a mod, grayed out on hover and outlined if selected"""
+        mod = index.data(QtCore.Qt.UserRole)
+        painter.save()
+        if option.state & Qt.QStyle.State_MouseOver:
+            painter.fillRect(option.rect, QtGui.QColor(0, 0, 0, 64))
+        if option.state & Qt.QStyle.State_Selected:
+            painter.setPen(option.palette.color(QtGui.QPalette.WindowText))
+            painter.drawRect(option.rect.adjusted(0, 0, -1, -1))
+        rect = option.rect.adjusted(10, 10, -10, -10)
+        painter.drawPixmap(rect.left(), rect.top(), index.data(QtCore.Qt.DecorationRole))
+
+        textRect = rect.adjusted(64 + 12, 0, 0, 0)
+        painter.setPen(option.palette.color(QtGui.QPalette.WindowText))
+        painter.setFont(Fonts.smallTitleFont)
+        nameHeight = self.nameMetrics.height()
+        painter.drawText(textRect.left(), textRect.top(), textRect.width(), nameHeight, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                         self.nameMetrics.elidedText(mod["name"], QtCore.Qt.ElideRight, textRect.width()))
+        painter.setFont(Fonts.textFont)
+        textHeight = self.textMetrics.height()
+        platforms = ", ".join(platformNames[platform] for platform in mod.get("availableOn", [mod["platform"]]))
+        for line, text in enumerate((f"by {mod['author']}", platforms)):
+            painter.drawText(textRect.left(), textRect.top() + nameHeight + line*textHeight, textRect.width(), textHeight, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                             self.textMetrics.elidedText(text, QtCore.Qt.ElideRight, textRect.width()))
+        painter.restore()
+
+class ModVersionsModel(QtCore.QAbstractListModel):
+    batchSize = 200  # number of rows revealed at once while scrolling
+    def __init__(self):
+        """the filtered versions of a mod, newest first, revealed to the view by batches"""
+        super().__init__()
+        self.versions = None  # versions of the mod, indexed by minecraft version
+        self.filtered = []  # versions matching the filters
+        self.loaded = 0  # number of filtered versions shown by the view
+        self.latestId = None
+        self.recommendedId = None
+        self.installedId = None
+        self.releaseTypes = {"release", "beta", "alpha"}
+        self.gameVersion = None  # only show versions for this minecraft version, None for all
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index:QtCore.QModelIndex, role:int=QtCore.Qt.DisplayRole):
+        """give the label, font or record of a version"""
+        if not index.isValid():
+            return None
+        version = self.filtered[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            text = f"{version.releaseType} - {version.versionName}"
+            if version.versionId == self.recommendedId:
+                text = f"(recommended) {text}"
+            if version.versionId == self.latestId:
+                text = f"(latest) {text}"
+            if version.versionId == self.installedId:
+                text = f"(installed) {text}"
+            return text
+        elif role == QtCore.Qt.FontRole:
+            return Fonts.subtitleFont
+        elif role == QtCore.Qt.UserRole:
+            return version
+        return None
 
-    def onEnter(self, event):
-        self.setHovered(True)
-        event.accept()
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and self.loaded < len(self.filtered)
 
-    def onLeave(self, event):
-        self.setHovered(False)
-        event.accept()
-    
-    def setHovered(self, hovered:bool):
-        """gray out the frame on hover"""
-        if hovered:
-            self.setStyleSheet("background-color: rgba(0, 0, 0, 64);")
-            for widget in (self.textWidget, self.nameLabel, self.iconLabel):  # avoid applying shadow to inner widgets
-                widget.setStyleSheet("background-color: rgba(0, 0, 0, 0)")
-        else:
-            self.setStyleSheet("")
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """reveal the next batch of versions when the view reaches the end"""
+        self.loadUntil(self.loaded + self.batchSize - 1)
 
-    def setSelected(self, selected:bool):
-        """outline the frame if selected"""
-        if selected:
-            self.setFrameShape(Qt.QFrame.Box)
-            self.isSelected = True
-            self.wasSelected.emit(self.modData)
-        else:
-            self.setFrameShape(Qt.QFrame.NoFrame)
-            self.isSelected = False
+    def loadUntil(self, row:int):
+        """make sure the given row is shown by the view"""
+        row = min(row, len(self.filtered) - 1)
+        if row >= self.loaded:
+            self.beginInsertRows(QtCore.QModelIndex(), self.loaded, row)
+            self.loaded = row + 1
+            self.endInsertRows()
 
-class ModVersionRadio(Qt.QWidget):
+    def setVersions(self, versions:modRecords.ModVersions, gameVersion:str, installedId:str=None):
+        """replace the versions, finding the latest one and the recommended one (the newest release for the game version)"""
+        self.versions = versions
+        self.latestId = versions.versions[0].versionId if versions.versions else None
+        recommended = versions.recommended(gameVersion)
+        self.recommendedId = recommended.versionId if recommended else None
+        self.installedId = installedId
+        self.applyFilters()
+
+    def setFilters(self, releaseTypes:set, gameVersion:str=None):
+        """only show the versions of the given release types and minecraft version"""
+        self.releaseTypes = releaseTypes
+        self.gameVersion = gameVersion
+        self.applyFilters()
+
+    def applyFilters(self):
+        """filter the versions again and only show the first batch"""
+        self.beginResetModel()
+        versions = self.versions.forGameVersion(self.gameVersion) if self.versions else []
+        self.filtered = [version for version in versions if version.releaseType in self.releaseTypes]
+        self.loaded = min(self.batchSize, len(self.filtered))
+        self.endResetModel()
+
+    def rowOf(self, versionId:str) -> int:
+        """get the row of a version among the filtered ones, loading the rows up to it, -1 if it is filtered out"""
+        for row, version in enumerate(self.filtered):
+            if version.versionId == versionId:
+                self.loadUntil(row)
+                return row
+        return -1
+
+class ModVersionPicker(Qt.QWidget):
     def __init__(self):
-        """a serie of radio buttons to select the mod version, given a list of versions with their properties"""
+        """a list to select the mod version, with filters by release type and minecraft version, only creating the visible rows"""
         super().__init__()
-        self.versions = {}
-        self.radioButtons = []
         self.mainLayout = Qt.QVBoxLayout()
+        self.mainLayout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(self.mainLayout)
-        self.radioGroup = Qt.QButtonGroup(self)
-    
-    def setVersions(self, versions:dict, gameVersion:str, currentVersion:str=None):
-        """update the radio buttons with the new versions"""
-        self.versions = versions
-        # clear previous radio buttons
-        for radioButton in self.radioButtons:
-            self.radioGroup.removeButton(radioButton)
-        self.radioButtons = []
-        for i in reversed(range(self.mainLayout.count())):
-            self.mainLayout.itemAt(i).widget().deleteLater()
-        
-        # create new radio buttons
-        foundRecommended = False
-        isFirst = True
-        for version, properties in self.versions.items():
-            text = f"{properties['releaseType']} - {version}"
-            if isFirst:
-                text = f"(latest) {text}"
-            if not foundRecommended and properties['releaseType'] == "release" and gameVersion in properties['mcVersions']:
-                text = f"(recommended) {text}"
-                foundRecommended = True
-            radioButton = Qt.QRadioButton(text)
-            radioButton.setFont(Fonts.subtitleFont)
-            self.radioGroup.addButton(radioButton)
-            self.radioButtons.append(radioButton)
-            if version == currentVersion:
-                radioButton.setChecked(True)
-            self.mainLayout.addWidget(radioButton)
-            isFirst = False
-        
-    def getSelectionData(self) -> dict:
-        """return the version data of the selected radio button"""
-        for radioButton in self.radioButtons:
-            if radioButton.isChecked():
-                version = radioButton.text()
-                cleanVersion = version
-                for prefix in ["(latest) ", "(recommended) ", "release - ", "beta - ", "alpha - "]:
-                    cleanVersion = cleanVersion.replace(prefix, "", 1)  # remove the prefix
-                return self.versions[cleanVersion]
-        return None  # if no version selected
-    
-    def getCheckedVersion(self):
-        """return the version data of the checked radio button"""
-        for radioButton in self.radioGroup.buttons():
-            if radioButton.isChecked():
-                version = radioButton.text()
-                return version, self.versions[version]
-        return None
 
+        # filters
+        self.filtersWidget = Qt.QWidget()
+        self.filtersLayout = Qt.QHBoxLayout()
+        self.filtersLayout.setContentsMargins(0, 0, 0, 0)
+        self.filtersWidget.setLayout(self.filtersLayout)
+        self.mainLayout.addWidget(self.filtersWidget)
+
+        self.releaseTypeChecks = {}
+        for releaseType in ("release", "beta", "alpha"):
+            self.releaseTypeChecks[releaseType] = Qt.QCheckBox(releaseType)
+            self.releaseTypeChecks[releaseType].setFont(Fonts.textFont)
+            self.releaseTypeChecks[releaseType].setChecked(True)
+            self.releaseTypeChecks[releaseType].stateChanged.connect(self.updateFilters)
+            self.filtersLayout.addWidget(self.releaseTypeChecks[releaseType])
+
+        self.gameVersionSelect = Qt.QComboBox()
+        self.gameVersionSelect.setFont(Fonts.textFont)
+        self.gameVersionSelect.currentIndexChanged.connect(self.updateFilters)
+        self.filtersLayout.addWidget(self.gameVersionSelect, 1)
+
+        self.recommendedButton = Qt.QPushButton(lang("goToRecommended"))
+        self.recommendedButton.setFont(Fonts.textFont)
+        self.recommendedButton.clicked.connect(self.jumpToRecommended)
+        self.filtersLayout.addWidget(self.recommendedButton)
+
+        # list of the versions
+        self.versionsModel = ModVersionsModel()
+        self.versionsView = Qt.QListView()
+        self.versionsView.setModel(self.versionsModel)
+        self.versionsView.setUniformItemSizes(True)
+        self.versionsView.setSelectionMode(Qt.QAbstractItemView.SingleSelection)
+        self.versionsView.setFrameShape(Qt.QFrame.NoFrame)
+        self.mainLayout.addWidget(self.versionsView)
+
+    def setVersions(self, versions:modRecords.ModVersions, gameVersion:str, currentVersionId:str=None):
+        """show new versions, selecting the installed one if any"""
+        self.gameVersionSelect.blockSignals(True)  # the filters are applied once at the end
+        self.gameVersionSelect.clear()
+        self.gameVersionSelect.addItem(lang("allGameVersions"), None)
+        for mcVersion in sorted(versions.byGameVersion, key=lambda mcVersion: [int(part) if part.isdigit() else 0 for part in mcVersion.split(".")], reverse=True):
+            self.gameVersionSelect.addItem(mcVersion, mcVersion)
+        self.gameVersionSelect.blockSignals(False)
+        self.versionsModel.setVersions(versions, gameVersion, currentVersionId)
+        self.updateFilters()
+        if currentVersionId is not None:
+            self.selectVersion(currentVersionId)
+
+    def updateFilters(self):
+        """apply the filters chosen by the user, keeping the selected version if it still matches them"""
+        selected = self.getSelectedVersion()
+        releaseTypes = {releaseType for releaseType, check in self.releaseTypeChecks.items() if check.isChecked()}
+        self.versionsModel.setFilters(releaseTypes, self.gameVersionSelect.currentData())
+        if selected is not None:
+            self.selectVersion(selected.versionId)
+
+    def selectVersion(self, versionId:str):
+        """select a version by its id and scroll to it"""
+        row = self.versionsModel.rowOf(versionId)
+        if row >= 0:
+            index = self.versionsModel.index(row)
+            self.versionsView.setCurrentIndex(index)
+            self.versionsView.scrollTo(index, Qt.QAbstractItemView.PositionAtCenter)
+
+    def jumpToRecommended(self):
+        """select the recommended version, clearing the filters hiding it"""
+        recommendedId = self.versionsModel.recommendedId
+        if recommendedId is None:
+            return
+        if self.versionsModel.rowOf(recommendedId) < 0:
+            for check in self.releaseTypeChecks.values():
+                check.blockSignals(True)
+                check.setChecked(True)
+                check.blockSignals(False)
+            self.gameVersionSelect.blockSignals(True)
+            self.gameVersionSelect.setCurrentIndex(0)
+            self.gameVersionSelect.blockSignals(False)
+            self.updateFilters()
+        self.selectVersion(recommendedId)
+
+    def getSelectedVersion(self) -> modRecords.ModVersion:
+        """return the record of the selected version"""
+        indexes = self.versionsView.selectionModel().selectedIndexes() if self.versionsView.selectionModel() else []
+        if not indexes:
+            return None  # if no version selected
+        return indexes[0].data(QtCore.Qt.UserRole)
 
 class addProfilePopup(Qt.QDialog):
     """popup to create a new profile"""
@@ -0,0 +1,136 @@
+from pathlib import Path
+import threading
+import logging
+import shutil
+import atexit
+import json
+import time
+import os
+
+
+log = logging.getLogger(__name__)
+
+class DiskCache():
+    def __init__(self, folderPath:Path, ttls:dict, maxSize:int):
+        """a persistent index of the files stored in the cache folder, tracking their freshness by kind and their last use for eviction"""
+        self.folderPath = folderPath
+        self.indexPath = folderPath/"cacheIndex.json"
+        self.ttls = ttls  # kind -> seconds before an entry of this kind must be fetched again
+        self.maxSize = maxSize  # in bytes
+        self.entries = {}  # relative path -> {"kind", "stored", "accessed", "size"}
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.lastSave = 0
+        self.folderPath.mkdir(parents=True, exist_ok=True)
+
+        if self.indexPath.exists():
+            try:
+                with open(self.indexPath, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                log.error(f"unable to read the cache index, starting with an empty one: {e}")
+        self.adoptUntracked()
+        atexit.register(self.save)
+
+    def key(self, path:Path) -> str:
+        """get the index key of a path inside the cache folder"""
+        return Path(path).relative_to(self.folderPath).as_posix()
+
+    def pathSize(self, path:Path) -> int:
+        """get the size of a cached file or folder"""
+        if os.path.isdir(path):
+            return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+        return os.path.getsize(path)
+
+    def adoptUntracked(self):
+        """register the entries present on disk but missing from the index, using their modification time"""
+        with self.lock:
+            for kind in self.ttls:
+                for path in self.folderPath.glob(f"{kind}/*/*"):
+                    key = self.key(path)
+                    if key not in self.entries and not path.name.endswith(".part"):
+                        mtime = path.stat().st_mtime
+                        self.entries[key] = {"kind": kind, "stored": mtime, "accessed": mtime, "size": self.pathSize(path)}
+                        self.dirty = True
+
+    def isFresh(self, path:Path) -> bool:
+        """check if a cached entry exists and is still within its time to live, marking it as used"""
+        key = self.key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not os.path.exists(path):
+                return False
+            entry["accessed"] = time.time()
+            self.dirty = True
+            return time.time() - entry["stored"] < self.ttls.get(entry["kind"], 0)
+
+    def getValidators(self, path:Path) -> dict:
+        """get the validators (etag and lastModified) the server sent with a cached entry"""
+        with self.lock:
+            return self.entries.get(self.key(path), {}).get("validators", {})
+
+    def refresh(self, path:Path):
+        """mark an entry as fresh again after the server confirmed it did not change"""
+        with self.lock:
+            entry = self.entries.get(self.key(path))
+            if entry is not None:
+                entry["stored"] = entry["accessed"] = time.time()
+                self.dirty = True
+                self.saveLater()
+
+    def store(self, path:Path, kind:str, validators:dict=None):
+        """register a freshly written entry, evicting the least recently used ones if over the size budget"""
+        key = self.key(path)
+        now = time.time()
+        with self.lock:
+            self.entries[key] = {"kind": kind, "stored": now, "accessed": now, "size": self.pathSize(path)}
+            if validators:
+                self.entries[key]["validators"] = validators
+            self.dirty = True
+            if sum(entry["size"] for entry in self.entries.values()) > self.maxSize:
+                self.evict()
+            self.saveLater()
+
+    def evict(self):
+        """remove vanished entries, then the least recently used ones until the cache fits in its size budget"""
+        with self.lock:
+            for key in [key for key in self.entries if not (self.folderPath/key).exists()]:
+                del self.entries[key]
+                self.dirty = True
+            totalSize = sum(entry["size"] for entry in self.entries.values())
+            for key in sorted(self.entries, key=lambda key: self.entries[key]["accessed"]):
+                if totalSize <= self.maxSize:
+                    break
+                path = self.folderPath/key
+                try:
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink(missing_ok=True)
+                except OSError as e:
+                    log.warning(f"unable to evict {key} from the cache: {e}")
+                    continue
+                totalSize -= self.entries.pop(key)["size"]
+                self.dirty = True
+                log.debug(f"evicted {key} from the cache")
+            self.saveLater()
+
+    def saveLater(self):
+        """save the index if it was not saved recently, it is always saved at exit"""
+        if time.time() - self.lastSave > 5:
+            self.save()
+
+    def save(self):
+        """write the index to the disk if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            tempPath = self.indexPath.with_suffix(".json.part")
+            try:
+                with open(tempPath, "w", encoding="utf-8") as f:
+                    json.dump(self.entries, f)
+                os.replace(tempPath, self.indexPath)
+                self.dirty = False
+                self.lastSave = time.time()
+            except OSError as e:
+                log.error(f"unable to save the cache index: {e}")
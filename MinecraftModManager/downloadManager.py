@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5 import QtCore
+from pathlib import Path
+import threading
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+class BandwidthLimiter():
+    def __init__(self, bytesPerSecond:int):
+        """a token bucket shared by every download to cap the total bandwidth"""
+        self.rate = bytesPerSecond
+        self.tokens = bytesPerSecond
+        self.lastRefill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount:int):
+        """wait until the given amount of bytes can be transferred without going over the limit"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.lastRefill)*self.rate)
+            self.lastRefill = now
+            self.tokens -= amount
+            delay = -self.tokens/self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+class DownloadManager(QtCore.QObject):
+    jobProgress = QtCore.pyqtSignal(int, int, int)  # job id, downloaded bytes, total bytes (0 if unknown)
+    totalProgress = QtCore.pyqtSignal(int, int)  # downloaded bytes and total bytes of the jobs queued since the manager was last idle
+    jobFinished = QtCore.pyqtSignal(int, bool)  # job id, success
+    allFinished = QtCore.pyqtSignal(int)  # number of failed jobs since the manager was last idle
+    def __init__(self, methods, maxConcurrent:int, speedLimit:int=0):
+        """a queue of downloads running a few at a time, with progress signals and an optional bandwidth cap in KiB/s"""
+        super().__init__()
+        self.methods = methods
+        self.executor = ThreadPoolExecutor(max_workers=maxConcurrent, thread_name_prefix="download")
+        self.limiter = BandwidthLimiter(speedLimit*1024) if speedLimit else None
+        self.jobs = {}  # job id -> {"destination", "done", "total"}
+        self.nextId = 0
+        self.failed = 0
+        self.finishedDone = 0  # bytes of the jobs finished since the manager was last idle, to keep the total progress growing
+        self.finishedTotal = 0
+        self.lock = threading.Lock()
+
+    def submit(self, url:str, destination:Path, hashes:dict=None, onFinished=None) -> int:
+        """queue a download and return its job id, onFinished(success) is called on the download thread once it ends"""
+        with self.lock:
+            for jobId, job in self.jobs.items():
+                if job["destination"] == destination:  # the same file is already being downloaded
+                    return jobId
+            jobId = self.nextId
+            self.nextId += 1
+            self.jobs[jobId] = {"destination": destination, "done": 0, "total": 0, "lastEmit": 0}
+        self.executor.submit(self.run, jobId, url, destination, hashes, onFinished)
+        log.debug(f"queued download {jobId} of {url}")
+        return jobId
+
+    def isBusy(self) -> bool:
+        """check if some downloads are queued or running"""
+        with self.lock:
+            return bool(self.jobs)
+
+    def run(self, jobId:int, url:str, destination:Path, hashes:dict, onFinished):
+        """download a file on a worker thread"""
+        success = False
+        try:
+            success = self.methods.downloadFile(url, destination, hashes, lambda done, total: self.updateProgress(jobId, done, total), self.limiter)
+            if onFinished:
+                onFinished(success)
+        except Exception as e:
+            log.error(f"download {jobId} of {url} failed: {e}")
+            success = False
+        self.jobFinished.emit(jobId, success)
+        with self.lock:
+            job = self.jobs.pop(jobId)
+            self.finishedDone += job["done"]
+            self.finishedTotal += max(job["total"], job["done"])
+            self.failed += not success
+            idle = not self.jobs
+            failed = self.failed
+            if idle:
+                self.failed = self.finishedDone = self.finishedTotal = 0
+        if idle:
+            self.allFinished.emit(failed)
+
+    def updateProgress(self, jobId:int, done:int, total:int):
+        """record the progress of a job, emitting the signals at most 10 times per second per job"""
+        with self.lock:
+            job = self.jobs[jobId]
+            job["done"], job["total"] = done, total
+            now = time.monotonic()
+            if now - job["lastEmit"] < 0.1 and done != total:
+                return
+            job["lastEmit"] = now
+            totalDone = self.finishedDone + sum(job["done"] for job in self.jobs.values())
+            totalSize = self.finishedTotal + sum(job["total"] for job in self.jobs.values())
+        self.jobProgress.emit(jobId, done, total)
+        self.totalProgress.emit(totalDone, totalSize)
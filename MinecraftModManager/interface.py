@@ -3,7 +3,6 @@ from usefulVariables import *  # local variables
 import PyQt5.QtWidgets as Qt
 from PyQt5 import QtCore, QtGui
 from pathlib import Path
-import threading
 import logging
 import markdown
 import ctypes
@@ -19,6 +18,7 @@ Methods = backendMethods.Methods()  # setup the software
 
 
 class Window(Qt.QMainWindow):
+    searchFinished = QtCore.pyqtSignal(int, int, object)  # search number, page, (list of mods found, more pages exist) or None if the search failed
     def __init__(self):
         """a class to manage the app and its main window"""
         self.currentProfile = None
@@ -227,6 +227,14 @@ class Window(Qt.QMainWindow):
         self.configureProfileButton.clicked.connect(self.configureProfile)
         self.profileButtonsLayout.addWidget(self.configureProfileButton, 1, 1)
 
+        # check mods updates button
+        self.checkUpdatesButton = Qt.QPushButton(lang("checkUpdates"))
+        self.checkUpdatesButton.setFont(Fonts.subtitleFont)
+        self.checkUpdatesButton.setSizePolicy(Qt.QSizePolicy.Expanding, Qt.QSizePolicy.Fixed)
+        self.checkUpdatesButton.setFixedHeight(40)
+        self.checkUpdatesButton.clicked.connect(self.checkUpdates)
+        self.profileButtonsLayout.addWidget(self.checkUpdatesButton, 2, 0, 1, 2)
+
         # separation line
         self.separationLine = customWidgets.SeparationLine()
         self.modsListLayout.addWidget(self.separationLine)
@@ -258,8 +266,12 @@ class Window(Qt.QMainWindow):
         self.platformLayout.addWidget(self.platformLabel)
 
         self.platformSelect = Qt.QComboBox()
-        self.platformSelect.addItems(["Modrinth", "CurseForge"])
+        self.platformSelect.addItem(lang("allPlatforms"), "all")
+        for platform in availablePlatforms:
+            self.platformSelect.addItem(platformNames[platform], platform)
+        self.platformSelect.setCurrentIndex(1)
         self.platformSelect.setFont(Fonts.subtitleFont)
+        self.platformSelect.currentIndexChanged.connect(lambda: self.searchMod() if self.startedSearching else None)
         self.platformLayout.addWidget(self.platformSelect)
 
         # search bar
@@ -273,8 +285,15 @@ class Window(Qt.QMainWindow):
         self.searchBar.setFixedHeight(40)
         self.searchBar.setPlaceholderText(lang("searchQuery"))
         self.searchBar.returnPressed.connect(self.searchMod)
+        self.searchBar.textChanged.connect(self.onSearchTextChanged)
         self.searchLayout.addWidget(self.searchBar)
 
+        # search as you type, once the user stopped typing for a moment
+        self.searchTimer = QtCore.QTimer()
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(400)
+        self.searchTimer.timeout.connect(self.searchMod)
+
         self.searchButton = Qt.QPushButton()
         self.searchButton.setIcon(QtGui.QIcon(str(iconsAssetsDir/"search.png")))
         self.searchButton.setIconSize(QtCore.QSize(25, 25))
@@ -290,15 +309,26 @@ class Window(Qt.QMainWindow):
         self.onlySearchCompatible.stateChanged.connect(lambda: self.searchMod() if self.startedSearching else None)  # only restart search if there is the user has already made one
         self.modSearchLayout.addWidget(self.onlySearchCompatible)
 
-        # results list
-        self.resultsScroll = Qt.QScrollArea()
-        self.resultsScroll.setWidgetResizable(True)
-        self.resultsScroll.setFrameShape(Qt.QFrame.NoFrame)
-        self.resultsScrollWidget = Qt.QWidget()
-        self.resultsScrollLayout = Qt.QVBoxLayout(self.resultsScrollWidget)
-        self.resultsScrollLayout.setAlignment(QtCore.Qt.AlignTop)
-        self.resultsScroll.setWidget(self.resultsScrollWidget)
-        self.modSearchLayout.addWidget(self.resultsScroll)
+        # loading state of the search
+        self.searchStatusLabel = Qt.QLabel(lang("searching"))
+        self.searchStatusLabel.setFont(Fonts.bigTextFont)
+        self.searchStatusLabel.setVisible(False)
+        self.modSearchLayout.addWidget(self.searchStatusLabel)
+
+        # results list, only the visible rows are painted and more results are fetched when scrolling to the end
+        self.resultsModel = customWidgets.SearchResultsModel()
+        self.resultsModel.moreRequested.connect(self.searchMore)
+        self.resultsModel.iconRequested.connect(lambda platform, modId, iconUrl: Methods.iconFetcher.fetch(platform, modId, iconUrl, "search"))
+        self.resultsView = Qt.QListView()
+        self.resultsView.setModel(self.resultsModel)
+        self.resultsDelegate = customWidgets.SearchResultDelegate()  # kept referenced, the view does not own it
+        self.resultsView.setItemDelegate(self.resultsDelegate)
+        self.resultsView.setUniformItemSizes(True)
+        self.resultsView.setMouseTracking(True)
+        self.resultsView.setFrameShape(Qt.QFrame.NoFrame)
+        self.resultsView.setVerticalScrollMode(Qt.QAbstractItemView.ScrollPerPixel)
+        self.resultsView.clicked.connect(lambda index: self.selectMod(index.data(QtCore.Qt.UserRole)))
+        self.modSearchLayout.addWidget(self.resultsView)
 
         self.modSearchWidget.setVisible(False)
     
@@ -367,20 +397,10 @@ class Window(Qt.QMainWindow):
         self.onlyShowCompatible.setChecked(True)
         self.modVersionsLayout.addWidget(self.onlyShowCompatible)
 
-        # list of available versions
-        self.versionsScroll = Qt.QScrollArea()
-        self.versionsScroll.setWidgetResizable(True)
-        self.versionsScroll.setFrameShape(Qt.QFrame.NoFrame)
-        self.versionsScrollWidget = Qt.QWidget()
-        self.versionsScrollLayout = Qt.QVBoxLayout(self.versionsScrollWidget)
-        self.versionsScrollLayout.setAlignment(QtCore.Qt.AlignTop)
-        self.versionsScroll.setWidget(self.versionsScrollWidget)
-        self.modVersionsLayout.addWidget(self.versionsScroll)
-
-        # radio buttons for each version
-        self.versionsRadio = customWidgets.ModVersionRadio()
+        # list of available versions, only the visible rows are created
+        self.versionsPicker = customWidgets.ModVersionPicker()
         self.onlyShowCompatible.stateChanged.connect(self.updateVersions)
-        self.versionsScrollLayout.addWidget(self.versionsRadio)
+        self.modVersionsLayout.addWidget(self.versionsPicker)
 
         # buttons to install or remove mod
         self.installButtonsWidget = Qt.QWidget()
@@ -407,6 +427,16 @@ class Window(Qt.QMainWindow):
     def setupInterface(self):
         """setup the interface after its creation"""
         self.startedSearching = False
+        self.searchGeneration = 0  # increased by each search, results of older searches are ignored
+        self.searchFuture = None
+        self.searchParams = None  # parameters of the latest search, to fetch its next pages
+        self.searchFinished.connect(self.showSearchResults)
+        self.installedModsWidgets = []
+        Methods.iconFetcher.iconReady.connect(self.updateModIcon)
+        Methods.signals.projectRefreshed.connect(self.onProjectRefreshed)
+        self.downloadProgress = None
+        Methods.downloadManager.totalProgress.connect(self.updateDownloadProgress)
+        Methods.downloadManager.allFinished.connect(self.onDownloadsFinished)
         self.refreshProfiles()
     
     def addProfile(self):
@@ -414,6 +444,7 @@ class Window(Qt.QMainWindow):
         self.addProfilePopup = customWidgets.addProfilePopup()
         log.info(f"opening profile creation screen")
         self.addProfilePopup.exec_()
+        Methods.invalidateProfiles()
         self.refreshProfiles()
         self.refreshInstalledMods()
     
@@ -442,62 +473,80 @@ class Window(Qt.QMainWindow):
                 self.currentProfile = profileName
                 self.modsListWidget.setVisible(True)
                 self.modSearchWidget.setVisible(True)
-                self.currentProfileProperties = Methods.getProfiles()[profileName]
             else:
                 profile.setSelected(False)
+        self.currentProfileProperties = Methods.getProfile(profileName)
         
         # put the profile infos in the mods list
         self.profileLabel.setText(self.currentProfileProperties["name"])
         self.profileVersionLabel.setText(self.currentProfileProperties["version"])
         self.refreshInstalledMods()
     
+    def onSearchTextChanged(self, text:str):
+        """restart the search delay while the user is typing"""
+        if text.strip():
+            self.searchTimer.start()
+        else:
+            self.searchTimer.stop()
+
     def searchMod(self):
-        """search for a mod on the selected platform"""
-        #TODO: optimize by not freezing the UI while searching
+        """search for a mod on the selected platform in the background"""
+        self.searchTimer.stop()
         self.startedSearching = True
+        self.searchGeneration += 1
+        if self.searchFuture is not None:
+            self.searchFuture.cancel()  # drop the previous search if it did not start yet
         modloader = self.currentProfileProperties["modloader"].lower()
         version = self.currentProfileProperties["version"]
-        platform = self.platformSelect.currentText().lower()
-        results = Methods.searchMod(self.searchBar.text(), platform, modloader, self.onlySearchCompatible.isChecked(), version)
-        if platform == "modrinth":
-            mods = Methods.modrinthSearchToMods(results)
-        elif platform == "curseforge":
-            mods = Methods.curseforgeSearchToMods(results)
-        
-        # remove all mods from the list
-        for i in reversed(range(self.resultsScrollLayout.count())):
-            self.resultsScrollLayout.itemAt(i).widget().deleteLater()
-        
-        # add all mods to the list
-        self.modWidgets = []  # list of all mod widgets objects
-        for mod in mods:
-            self.modWidgets.append(customWidgets.SearchModSelect(mod))
-            # download the mod icon
-            if platform == "modrinth":
-                iconUrl = mod["rawData"]["icon_url"]
-            elif platform == "curseforge":
-                if "thumbnailUrl" in mod["rawData"]["logo"]:
-                    iconUrl = mod["rawData"]["logo"]["thumbnailUrl"]
-                else:
-                    iconUrl = None
-            else:
-                iconUrl = None
-                log.error(f"unknown platform: {platform}")
-            threading.Thread(target=Methods.downloadIcon, args=( platform, mod["id"], iconUrl, self.modWidgets[-1])).start()
-            self.resultsScrollLayout.addWidget(self.modWidgets[-1])
-            self.modWidgets[-1].wasSelected.connect(self.selectMod)
+        platform = self.platformSelect.currentData()
+        self.searchParams = (self.searchBar.text(), platform, modloader, self.onlySearchCompatible.isChecked(), version)
+        self.searchStatusLabel.setText(lang("searching"))
+        self.searchStatusLabel.setVisible(True)
+        self.searchFuture = Methods.searchExecutor.submit(self.runSearch, self.searchGeneration, 0, *self.searchParams)
+
+    def searchMore(self):
+        """fetch the next page of results of the latest search"""
+        if self.searchParams is not None:
+            self.searchStatusLabel.setText(lang("searching"))
+            self.searchStatusLabel.setVisible(True)
+            self.searchFuture = Methods.searchExecutor.submit(self.runSearch, self.searchGeneration, self.resultsModel.nextPage, *self.searchParams)
+
+    def runSearch(self, generation:int, page:int, query:str, platform:str, modloader:str, onlyCompatible:bool, version:str):
+        """run a search on a worker thread and send its results to the interface"""
+        if generation != self.searchGeneration:  # a newer search was started meanwhile
+            return
+        try:
+            result = Methods.searchMods(query, platform, modloader, onlyCompatible, version, page)
+        except Exception as e:
+            log.error(f"search for {query} on {platform} failed: {e}")
+            result = None
+        self.searchFinished.emit(generation, page, result)
+
+    def showSearchResults(self, generation:int, page:int, result:tuple):
+        """show a page of results of a search if it is still the latest one"""
+        if generation != self.searchGeneration:
+            return
+        if result is None:
+            self.searchStatusLabel.setText(lang("searchFailed"))
+            result = ([], False)
+        else:
+            self.searchStatusLabel.setVisible(False)
+        mods, hasMore = result
+        if page == 0:
+            Methods.iconFetcher.cancel("search")
+            self.resultsModel.setMods(mods, hasMore)
+            self.resultsView.scrollToTop()
+        else:
+            self.resultsModel.addMods(mods, hasMore)
+        log.debug(f"showing page {page} of the search results, {self.resultsModel.rowCount()} mods listed")
     
     def selectMod(self, modData:dict):
         """select a mod and deselect the others"""
         self.currentModData = modData
         modId = modData["id"]
         platform = modData["platform"].lower()
-        for mod in self.modWidgets:
-            if mod.modId == modId:
-                self.currentMod = modId
-                self.modInstallWidget.setVisible(True)
-            else:
-                mod.setSelected(False)
+        self.currentMod = modId
+        self.modInstallWidget.setVisible(True)
         
         modRequestData = Methods.getModInfos(modId, modData["platform"])
         
@@ -532,6 +581,7 @@ class Window(Qt.QMainWindow):
     def refreshInstalledMods(self):
         """refresh the list of installed mods"""
         # remove all mods from the list
+        Methods.iconFetcher.cancel("installed")
         for i in reversed(range(self.modsScrollLayout.count())):
             self.modsScrollLayout.itemAt(i).widget().deleteLater()
         
@@ -543,10 +593,17 @@ class Window(Qt.QMainWindow):
         for mod in mods:
             self.installedModsWidgets.append(customWidgets.ModSelect(mod))
             if not isinstance(mod, str):  # if the mod is not custom jar
-                threading.Thread(target=Methods.downloadIcon, args=(mod["platform"], mod["modId"], mod["iconUrl"], self.installedModsWidgets[-1])).start()
+                Methods.iconFetcher.fetch(mod["platform"], mod["modId"], mod["iconUrl"], "installed")
             self.modsScrollLayout.addWidget(self.installedModsWidgets[-1])
             self.installedModsWidgets[-1].wasSelected.connect(self.selectInstalledMod)
     
+    def updateModIcon(self, platform:str, modId:str):
+        """refresh the icon of the mod widgets matching a downloaded icon"""
+        self.resultsModel.updateIcon(platform, modId)
+        for modWidget in self.installedModsWidgets:
+            if not modWidget.isCustom and modWidget.platform == platform and modWidget.modId == modId:
+                modWidget.updateIcon()
+    
     def selectInstalledMod(self, modData:object):
         """select an installed mod and deselect the others, or open popup for custom jar mods"""
         if isinstance(modData, str):  # if the mod is a custom jar
@@ -589,21 +646,27 @@ class Window(Qt.QMainWindow):
         self.updateVersions()
 
     
+    def onProjectRefreshed(self, platform:str, modId:str):
+        """reload the versions of the displayed mod when its cached data was refreshed in the background"""
+        if self.modInstallWidget.isVisible() and self.currentMod == modId and self.currentModData["platform"].lower() == platform:
+            log.debug(f"data of the displayed mod {modId} changed, reloading its versions")
+            self.updateVersions()
+    
     def updateVersions(self):
         """update the list of versions for the selected mod"""
-        #TODO: optimize by dynamically loading the versions in the UI
         self.versionsInfos = Methods.getVersionsInfos(self.currentMod, self.currentModData["platform"].lower(), self.currentProfileProperties["modloader"].lower(), self.onlyShowCompatible.isChecked(), self.currentProfileProperties["version"])
-        installedVersion = Methods.getInstalledVersion(self.currentProfile, self.currentMod, self.currentModData["platform"])
-        if installedVersion is not None:
-            self.versionsRadio.setVersions(self.versionsInfos, self.currentProfileProperties["version"], installedVersion)
-        else:
-            self.versionsRadio.setVersions(self.versionsInfos, self.currentProfileProperties["version"])
+        installedVersionId = Methods.getInstalledVersionId(self.currentProfile, self.currentMod, self.currentModData["platform"])
+        self.versionsPicker.setVersions(self.versionsInfos, self.currentProfileProperties["version"], installedVersionId)
     
     def clearSearch(self):
         """clear the search section"""
         self.searchBar.clear()
-        for i in reversed(range(self.resultsScrollLayout.count())):
-            self.resultsScrollLayout.itemAt(i).widget().deleteLater()
+        self.searchTimer.stop()
+        self.searchGeneration += 1  # ignore the results of a running search
+        self.searchStatusLabel.setVisible(False)
+        Methods.iconFetcher.cancel("search")
+        self.searchParams = None
+        self.resultsModel.clear()
         self.modInstallWidget.setVisible(False)
     
     def removeMod(self):
@@ -614,9 +677,55 @@ class Window(Qt.QMainWindow):
     
     def addMod(self):
         """add a mod"""
-        result = Methods.installCurrentMod(self.currentProfile, self.currentMod, self.currentModData["platform"], self.versionsRadio.getSelectionData())
+        result = Methods.installCurrentMod(self.currentProfile, self.currentMod, self.currentModData["platform"], self.versionsPicker.getSelectedVersion())
         if result is None:
-            self.refreshInstalledMods()
+            self.showDownloadProgress()
+    
+    def checkUpdates(self):
+        """check every mod of the profile for updates and offer to install them"""
+        Qt.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            updates = Methods.checkUpdates(self.currentProfile)
+        finally:
+            Qt.QApplication.restoreOverrideCursor()
+        if not updates:
+            Qt.QMessageBox.information(self, lang("checkUpdates"), lang("noUpdates"))
+            return
+        updatesList = "\n".join(f"{installed['modName']}: {installed['versionName']} → {newest['versionName']}" for installed, newest in updates)
+        confirm = Qt.QMessageBox.question(self, lang("checkUpdates"), f"{lang('updatesAvailable')}\n\n{updatesList}\n\n{lang('updateAllConfirm')}", Qt.QMessageBox.Yes | Qt.QMessageBox.No)
+        if confirm == Qt.QMessageBox.Yes:
+            for installed, newest in updates:
+                Methods.queueModInstall(self.currentProfile, newest, installed)
+            self.showDownloadProgress()
+    
+    def showDownloadProgress(self):
+        """show a progress dialog while the download manager is busy"""
+        if self.downloadProgress is None:
+            self.downloadProgress = Qt.QProgressDialog(lang("downloadingMods"), None, 0, 0, self)  # no cancel button
+            self.downloadProgress.setWindowTitle(lang("downloadingMods"))
+            self.downloadProgress.setWindowModality(QtCore.Qt.WindowModal)
+            self.downloadProgress.setMinimumDuration(0)
+            self.downloadProgress.setAutoClose(False)
+            self.downloadProgress.setAutoReset(False)
+        if Methods.downloadManager.isBusy():
+            self.downloadProgress.setMaximum(0)  # busy indicator until the sizes are known
+            self.downloadProgress.show()
+    
+    def updateDownloadProgress(self, done:int, total:int):
+        """update the download progress dialog"""
+        if self.downloadProgress is not None and total:
+            self.downloadProgress.setMaximum(1000)
+            self.downloadProgress.setValue(int(1000*done/total))
+    
+    def onDownloadsFinished(self, failed:int):
+        """close the progress dialog and refresh the mods once every download is done"""
+        if self.downloadProgress is not None:
+            self.downloadProgress.hide()
+        self.refreshInstalledMods()
+        if failed:
+            Qt.QMessageBox.critical(self, lang("error"), lang("downloadFailed"))
+        else:
+            Qt.QMessageBox.information(self, lang("success"), lang("modInstalled"))
     
     def configureProfile(self):
         """open the profile configuration popup"""
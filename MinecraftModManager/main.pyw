@@ -15,9 +15,9 @@ import sys
 # create folders if missing
 appDataDir.mkdir(parents=True, exist_ok=True)
 logDir.mkdir(parents=True, exist_ok=True)
-if cacheDir.exists():
-    shutil.rmtree(cacheDir)
-cacheDir.mkdir(parents=True, exist_ok=True)
+cacheDir.mkdir(parents=True, exist_ok=True)  # the cache is kept between sessions, its size is bounded by the backend
+if (cacheDir/"tempProfile").exists():  # leftover of an interrupted profile import or export
+    shutil.rmtree(cacheDir/"tempProfile")
 
 
 log.basicConfig(level=log.DEBUG, filename=appDataDir/"logs"/"latest.log", filemode="w", format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
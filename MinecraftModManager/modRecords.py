@@ -0,0 +1,78 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True, frozen=True)
+class ModInfo():
+    """the informations shared by every version of a mod, stored once"""
+    modId: str
+    platform: str
+    modloader: str
+    modName: str
+    authors: str
+    iconUrl: str
+    webpage: str
+
+    @classmethod
+    def fromData(cls, data:dict) -> "ModInfo":
+        """get the mod informations from version data, like the one saved in a profile manifest"""
+        return cls(str(data["modId"]), data["platform"], data["modloader"], data["modName"], data["authors"], data["iconUrl"], data["webpage"])
+
+
+@dataclass(slots=True)
+class ModVersion():
+    """a version of a mod with only the fields the app uses"""
+    mod: ModInfo
+    versionId: str
+    versionName: str
+    releaseType: str
+    mcVersions: tuple
+    downloadUrl: str
+    fileName: str
+    hashes: dict
+    dependencies: tuple = ()  # required mods of the same platform, as (mod id, pinned version id or None)
+    incompatibilities: tuple = ()  # ids of the mods of the same platform which must not be installed with it
+
+    def toData(self) -> dict:
+        """get the version data used to install the mod and saved in the profile manifest"""
+        return {"mcVersions": list(self.mcVersions),
+                "versionId": self.versionId,
+                "modId": self.mod.modId, "platform": self.mod.platform, "modloader": self.mod.modloader,
+                "releaseType": self.releaseType,
+                "downloadUrl": self.downloadUrl,
+                "fileName": self.fileName,
+                "hashes": self.hashes,
+                "versionName": self.versionName,
+                "modName": self.mod.modName,
+                "authors": self.mod.authors,
+                "iconUrl": self.mod.iconUrl,
+                "webpage": self.mod.webpage}
+
+
+@dataclass(slots=True)
+class ModVersions():
+    """the versions of a mod newest first, indexed by id and by minecraft version"""
+    mod: ModInfo
+    versions: list
+    byId: dict = field(init=False)  # version id -> version
+    byGameVersion: dict = field(init=False)  # minecraft version -> versions for it, newest first
+
+    def __post_init__(self):
+        self.byId = {version.versionId: version for version in self.versions}
+        self.byGameVersion = {}
+        for version in self.versions:
+            for mcVersion in version.mcVersions:
+                self.byGameVersion.setdefault(mcVersion, []).append(version)
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def forGameVersion(self, mcVersion:str=None) -> list:
+        """get the versions for a minecraft version, or all of them if None"""
+        return self.versions if mcVersion is None else self.byGameVersion.get(mcVersion, [])
+
+    def recommended(self, mcVersion:str) -> ModVersion:
+        """get the newest release for a minecraft version, None if there is none"""
+        return next((version for version in self.byGameVersion.get(mcVersion, []) if version.releaseType == "release"), None)
@@ -0,0 +1,136 @@
+from pathlib import Path
+import threading
+import logging
+import shutil
+import json
+import sys
+import os
+
+
+log = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # linux ioctl sharing the data blocks of two files on filesystems supporting it (btrfs, xfs...)
+
+def cloneFile(source:Path, destination:Path) -> bool:
+    """make a copy on write clone (reflink) of a file, return False if the system or filesystem does not support it"""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        with open(source, "rb") as sourceFile, open(destination, "wb") as destinationFile:
+            fcntl.ioctl(destinationFile.fileno(), FICLONE, sourceFile.fileno())
+        return True
+    except OSError:
+        Path(destination).unlink(missing_ok=True)
+        return False
+
+def placeFile(source:Path, destination:Path):
+    """place a file at the destination with a hardlink if possible, else with a reflink, else with a copy"""
+    tempPath = destination.with_name(f"{destination.name}.{threading.get_ident()}.part")
+    try:
+        os.link(source, tempPath)
+    except OSError:  # different drive or filesystem without hardlinks
+        if not cloneFile(source, tempPath):
+            shutil.copyfile(source, tempPath)
+    os.replace(tempPath, destination)
+
+
+class ModStore():
+    def __init__(self, folderPath:Path, rootPath:Path):
+        """a content addressed store of mod files keyed by their sha1, shared by every profile,
+        profiles use its files through hardlinks (or reflinks or copies when the drive does not support them) and every use is counted"""
+        self.folderPath = folderPath
+        self.rootPath = rootPath  # references are saved relative to this folder
+        self.indexPath = folderPath/"storeIndex.json"
+        self.references = {}  # sha1 -> list of the paths using the file
+        self.lock = threading.RLock()
+        self.folderPath.mkdir(parents=True, exist_ok=True)
+        if self.indexPath.exists():
+            try:
+                with open(self.indexPath, "r", encoding="utf-8") as f:
+                    self.references = json.load(f)
+            except (OSError, ValueError) as e:
+                log.error(f"unable to read the store index, starting with an empty one: {e}")
+
+    def blobPath(self, sha1:str) -> Path:
+        """get the path of a file in the store"""
+        return self.folderPath/sha1[:2]/f"{sha1}.jar"
+
+    def has(self, sha1:str) -> bool:
+        """check if a file is in the store"""
+        return bool(sha1) and self.blobPath(sha1.lower()).exists()
+
+    def add(self, path:Path, sha1:str):
+        """put a verified file in the store if it's missing and count the given path as using it"""
+        sha1 = sha1.lower()
+        with self.lock:
+            blobPath = self.blobPath(sha1)
+            if not blobPath.exists():
+                blobPath.parent.mkdir(parents=True, exist_ok=True)
+                placeFile(path, blobPath)
+            self.addReference(sha1, path)
+
+    def linkTo(self, sha1:str, destination:Path) -> bool:
+        """place a stored file at the destination without downloading it, return False if it is not in the store"""
+        if not sha1:
+            return False
+        sha1 = sha1.lower()
+        with self.lock:
+            blobPath = self.blobPath(sha1)
+            if not blobPath.exists():
+                return False
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            placeFile(blobPath, destination)
+            self.addReference(sha1, destination)
+        return True
+
+    def addReference(self, sha1:str, path:Path):
+        """count a path as using a stored file, and no longer the file previously at this path"""
+        reference = Path(path).relative_to(self.rootPath).as_posix()
+        with self.lock:
+            references = self.references.setdefault(sha1, [])
+            if reference in references:
+                return
+            references.append(reference)
+            for otherSha1 in list(self.references):  # the path was overwritten, like a mod updated to a file of the same name
+                if otherSha1 != sha1 and reference in self.references[otherSha1]:
+                    self.references[otherSha1].remove(reference)
+                    if not self.references[otherSha1]:
+                        del self.references[otherSha1]
+                        self.blobPath(otherSha1).unlink(missing_ok=True)
+                        log.debug(f"removed replaced file {otherSha1} from the store")
+            self.save()
+
+    def moveReferences(self, oldFolder:Path, newFolder:Path):
+        """update the references after a folder using stored files was moved, like a renamed profile"""
+        oldPrefix = f"{Path(oldFolder).relative_to(self.rootPath).as_posix()}/"
+        newPrefix = f"{Path(newFolder).relative_to(self.rootPath).as_posix()}/"
+        with self.lock:
+            for sha1, references in self.references.items():
+                self.references[sha1] = [f"{newPrefix}{reference[len(oldPrefix):]}" if reference.startswith(oldPrefix) else reference for reference in references]
+            self.save()
+
+    def collect(self):
+        """forget the references to files that were removed, then delete the stored files nobody uses anymore"""
+        with self.lock:
+            for sha1 in list(self.references):
+                self.references[sha1] = [reference for reference in self.references[sha1] if (self.rootPath/reference).exists()]
+                if not self.references[sha1]:
+                    del self.references[sha1]
+                    self.blobPath(sha1).unlink(missing_ok=True)
+                    log.debug(f"removed unused file {sha1} from the store")
+            for blobPath in self.folderPath.glob("*/*.jar"):  # files stored without any reference, after a crash
+                if blobPath.stem not in self.references:
+                    blobPath.unlink(missing_ok=True)
+            self.save()
+
+    def save(self):
+        """write the references index atomically"""
+        with self.lock:
+            tempPath = self.indexPath.with_suffix(".json.part")
+            try:
+                with open(tempPath, "w", encoding="utf-8") as f:
+                    json.dump(self.references, f)
+                os.replace(tempPath, self.indexPath)
+            except OSError as e:
+                log.error(f"unable to save the store index: {e}")
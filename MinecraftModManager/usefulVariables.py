@@ -28,11 +28,28 @@ profilesDir = appDataDir/"profiles"  # path to the profiles folder
 cacheDir = appDataDir/"cache"  # path to the cache folder
 logDir = appDataDir/"logs"  # path to the logs folder
 settingsFile = appDataDir/"settings.json"  # path to the settings file
+downloadsDir = appDataDir/"downloads"  # path to the unfinished downloads folder
+storeDir = appDataDir/"store"  # path to the mod files shared by every profile
+launchJournalFile = appDataDir/"launchJournal.json"  # path to the journal of the mods moved away while the game runs
 
 modrinthApi = "https://api.modrinth.com/v2"
 curseForgeApi = "http://mmm.ilwan.hackclub.app/curseforge"
 
 availablePlatforms = ["modrinth", "curseforge"]
+platformNames = {"modrinth": "Modrinth", "curseforge": "CurseForge"}  # displayed name of each platform
+searchPageSize = 50  # number of search results fetched at once per platform, the most curseforge allows
+curseforgeMaxSearchResults = 10000  # curseforge refuses to search past this many results
+curseforgeMaxValidators = 256  # answers of the proxy kept in memory with their etag, to be revalidated instead of downloaded again
+
+defaultSettings = {"connectTimeout": 5,  # seconds to wait for a connection to a server
+                   "readTimeout": 30,  # seconds to wait for a server to send data
+                   "connectionPoolSize": 20,  # maximum number of kept-alive connections per host
+                   "iconDownloadWorkers": 8,  # number of threads downloading mod icons
+                   "cacheMaxSize": 512,  # disk budget of the cache in megabytes
+                   "staleWhileRevalidate": True,  # show outdated cached data at once and refresh it in the background
+                   "maxConcurrentDownloads": 4,  # number of mod files downloaded at the same time
+                   "downloadSpeedLimit": 0}  # total download speed limit in KiB/s, 0 for no limit
+cacheTtls = {"modsData": 6*3600, "modsVersions": 6*3600, "modIcons": 7*24*3600}  # seconds before each kind of cached resource is fetched again
 
 appVersion = "0.1.0"
 
@@ -0,0 +1,198 @@
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import proxyCache  # local module
+import asyncio
+import uvicorn
+import httpx
+import math
+import os
+
+# load environnement variables
+load_dotenv()
+
+# configuring curseforge api, same settings as server.py
+CURSEFORGE_API_BASE_URL = "https://api.curseforge.com/v1"
+HEADERS = {"x-api-key": os.getenv("CURSEFORGE_API_KEY")}
+TIMEOUT = httpx.Timeout(float(os.getenv("PROXY_READ_TIMEOUT", 30)), connect=float(os.getenv("PROXY_CONNECT_TIMEOUT", 5)))
+POOL_SIZE = int(os.getenv("PROXY_POOL_SIZE", 32))
+MAX_QUEUE_WAIT = float(os.getenv("PROXY_MAX_QUEUE_WAIT", 10))
+
+cache = proxyCache.ResponseCache(int(os.getenv("PROXY_CACHE_MAX_MB", 256))*1024*1024, os.getenv("PROXY_CACHE_DB"))
+limiter = proxyCache.TokenBucket(float(os.getenv("PROXY_RATE_LIMIT", 10)), int(os.getenv("PROXY_RATE_BURST", 20)))  # per worker process
+flights = {}  # key -> future of the result of an upstream request in progress, shared by the identical requests
+readers = set()  # tasks reading upstream bodies, kept referenced until they end
+
+
+@asynccontextmanager
+async def lifespan(app:Starlette):
+    """open the pool of kept-alive connections to curseforge for the lifetime of the worker"""
+    if not HEADERS["x-api-key"]:
+        raise RuntimeError("CURSEFORGE_API_KEY is not set, add it to the environment or to the .env file next to the proxy")
+    async with httpx.AsyncClient(headers=HEADERS, timeout=TIMEOUT, limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)) as client:
+        app.state.client = client
+        yield
+
+async def cacheGet(key:str) -> tuple:
+    """read the cache without blocking the event loop on the sqlite file"""
+    return await run_in_threadpool(cache.get, key) if cache.dbPath else cache.get(key)
+
+async def cachePut(key:str, endpoint:str, answer:proxyCache.Answer):
+    """write the cache without blocking the event loop on the sqlite file"""
+    if cache.dbPath:
+        await run_in_threadpool(cache.put, key, endpoint, answer)
+    else:
+        cache.put(key, endpoint, answer)
+
+def finishFlight(key:str, result:tuple):
+    """give the result of an upstream request to the identical requests waiting for it"""
+    future = flights.pop(key, None)
+    if future is not None and not future.done():
+        future.set_result(result)
+
+async def proxyToCurseforge(request):
+    """interact with the curseforge api using the key, without blocking while waiting for it"""
+    endpoint = request.path_params["endpoint"]
+    # target url
+    url = f"{CURSEFORGE_API_BASE_URL}/{endpoint}"
+    # query parameters
+    query_params = dict(request.query_params)
+    # get http method
+    method = request.method
+    body = None
+    if method == "POST":  # bulk endpoints such as mods and mods/files take a json body
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+
+    # answer from the cache if the same request was made recently
+    key = proxyCache.cacheKey(method, endpoint, query_params, body)
+    cached = await cacheGet(key)
+    if cached is not None:
+        return fullAnswer(request, cached)
+
+    # wait for the same request if another client already sent it, if it fails try once more, with our own request or the one of another waiting client
+    for attempt in range(2):
+        if key not in flights:
+            break
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flights[key]), TIMEOUT.read + TIMEOUT.connect + MAX_QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            result = None
+        if result is not None:
+            return fullAnswer(request, result)
+    else:
+        return JSONResponse({"error": "the identical request in progress failed"}, status_code=502)
+    flights[key] = asyncio.get_running_loop().create_future()
+
+    # every way out of the leader gives a result to the identical requests, even when cancelled because the client left
+    response = None
+    forwarding = False
+    try:
+        # wait for our turn to use the api key
+        acquired, wait = limiter.reserve(MAX_QUEUE_WAIT)
+        if not acquired:
+            answer = proxyCache.tooManyRequestsAnswer(wait)
+            finishFlight(key, answer)  # the identical requests get the same 429
+            return fullAnswer(request, answer)
+        if wait:
+            await asyncio.sleep(wait)
+
+        # send request to curseforge, the body is only read while it is forwarded
+        client = request.app.state.client
+        try:
+            response = await client.send(client.build_request(method, url, params=query_params, json=body), stream=True)
+        except httpx.TimeoutException as e:
+            return JSONResponse({"error": str(e)}, status_code=504)
+        except httpx.HTTPError as e:
+            return JSONResponse({"error": str(e)}, status_code=502)
+
+        # curseforge asks to slow down, stop sending requests for a while and tell the client and the identical requests
+        forwarded_headers = {}
+        if response.status_code == 429:
+            retry_after = proxyCache.parseRetryAfter(response.headers.get("Retry-After"))
+            limiter.pause(retry_after)
+            forwarded_headers["Retry-After"] = str(math.ceil(retry_after))
+
+        # forward the bytes of curseforge as they arrive, without parsing them, compressed if the client accepts it
+        content_type = response.headers.get("Content-Type", "application/json")
+        encoding, headers = proxyCache.streamedAnswerHeaders(request.headers.get("Accept-Encoding"))
+        headers.update(forwarded_headers)
+        upstream = UpstreamBody(response, key, endpoint, content_type, forwarded_headers, encoding)
+        forwarding = True  # from now on the upstream body is read, cached and given to the identical requests whatever the client does
+        return StreamingResponse(upstream.forward(), status_code=response.status_code, media_type=content_type, headers=headers)
+    finally:
+        if not forwarding:
+            finishFlight(key, None)
+            if response is not None:
+                await response.aclose()
+
+
+class UpstreamBody():
+    def __init__(self, response:httpx.Response, key:str, endpoint:str, content_type:str, forwarded_headers:dict, encoding:str=None):
+        """the body of an upstream answer, read to its end by a task of its own so that the identical requests and the cache get it
+        even if the client that sent the request is slow or leaves"""
+        self.response = response
+        self.key = key
+        self.endpoint = endpoint
+        self.content_type = content_type
+        self.forwarded_headers = forwarded_headers
+        self.encoding = encoding
+        self.queue = asyncio.Queue()  # chunks for the client, None once the body ended
+        task = asyncio.get_running_loop().create_task(self.read())
+        readers.add(task)
+        task.add_done_callback(readers.discard)
+
+    async def read(self):
+        """read the body, compressed for the client if an encoding was chosen, then cache it if it is a success and give it to the identical requests"""
+        chunks = []
+        compressed = []  # the compressed body sent to the client is reused instead of compressing it again
+        compressor = proxyCache.StreamCompressor(self.encoding) if self.encoding else None
+        answer = None
+        try:
+            async for chunk in self.response.aiter_bytes():
+                chunks.append(chunk)
+                if compressor:
+                    chunk = compressor.compressChunk(chunk)
+                    compressed.append(chunk)
+                self.queue.put_nowait(chunk)
+            if compressor:
+                compressed.append(compressor.finish())
+                self.queue.put_nowait(compressed[-1])
+            self.queue.put_nowait(None)
+            # hashing and compressing the whole body would block the event loop
+            answer = await run_in_threadpool(proxyCache.Answer, self.response.status_code, self.content_type, b"".join(chunks), self.forwarded_headers, None,
+                                             {self.encoding: b"".join(compressed)} if self.encoding else None)
+            if answer.status == 200:
+                await run_in_threadpool(answer.compressAll)
+                await cachePut(self.key, self.endpoint, answer)
+        except httpx.HTTPError:
+            pass  # the connection to curseforge was lost, the client gets a truncated answer and nothing is cached
+        finally:
+            self.queue.put_nowait(None)  # nothing to do if the client already got the end of the body
+            finishFlight(self.key, answer)
+            await self.response.aclose()  # gives the connection back to the pool
+
+    async def forward(self):
+        """yield the body to the client as it is read"""
+        while True:
+            chunk = await self.queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+def fullAnswer(request, answer:proxyCache.Answer) -> Response:
+    """answer with a body already received in full, from the cache or from an identical request"""
+    status, headers, content = answer.respond(request.headers.get("If-None-Match"), request.headers.get("Accept-Encoding"))
+    return Response(content, status_code=status, media_type=answer.contentType, headers=headers)
+
+app = Starlette(routes=[Route("/curseforge/{endpoint:path}", proxyToCurseforge, methods=["GET", "POST"])], lifespan=lifespan)
+
+if __name__ == "__main__":
+    # run the app with several worker processes, each one handling thousands of concurrent requests
+    uvicorn.run("asyncServer:app", host="0.0.0.0", port=int(os.getenv("CURSEFORGE_PROXY_PORT", 8000)), workers=int(os.getenv("PROXY_WORKERS", 1)))
@@ -0,0 +1,301 @@
+from collections import OrderedDict
+import threading
+import sqlite3
+import hashlib
+import json
+import math
+import time
+import zlib
+import gzip
+import re
+
+try:
+    import brotli  # optional, gzip is used without it
+except ImportError:
+    brotli = None
+
+MIN_COMPRESSED_SIZE = 1024  # smaller answers are sent as is, compressing them saves nothing
+PRUNE_INTERVAL = 60  # seconds between two deletions of the expired answers of the sqlite cache
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)  # by order of preference
+
+# seconds before a cached answer of the curseforge api is fetched again, the first matching pattern is used
+ENDPOINT_TTLS = [(re.compile(r"^mods/search$"), 10*60),
+                 (re.compile(r"^mods/\d+/description$"), 24*3600),
+                 (re.compile(r"^mods/\d+/files$"), 15*60),
+                 (re.compile(r"^mods/\d+$"), 3600),
+                 (re.compile(r"^mods(/files)?$"), 15*60),  # bulk endpoints, the body is part of the key
+                 (re.compile(r".*"), 5*60)]
+
+def endpointTtl(endpoint:str) -> int:
+    """get the time to live of the answers of an endpoint"""
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.match(endpoint):
+            return ttl
+    return 0
+
+def cacheKey(method:str, endpoint:str, params:dict, body=None) -> str:
+    """build the key of a request, the same for any order of the query parameters or of the json body keys"""
+    normalizedParams = "&".join(f"{key}={value}" for key, value in sorted(params.items()) if value not in (None, ""))
+    key = f"{method} {endpoint.strip('/')}?{normalizedParams}"
+    if body is not None:
+        key += f" {hashlib.sha1(json.dumps(body, sort_keys=True, separators=(',', ':')).encode()).hexdigest()}"
+    return key
+
+def strongEtag(body:bytes) -> str:
+    """get a strong etag from the bytes of an answer"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def encodedEtag(etag:str, encoding:str) -> str:
+    """get the etag of a compressed variant of an answer, a strong etag must differ for each encoding"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+def etagMatches(ifNoneMatch:str, etag:str) -> bool:
+    """check if the If-None-Match header of a client contains the etag of the answer, in any of its encodings"""
+    if not ifNoneMatch:
+        return False
+    for tag in ifNoneMatch.split(","):
+        tag = tag.strip().removeprefix("W/")
+        for encoding in ENCODINGS:
+            tag = tag.replace(f'-{encoding}"', '"')
+        if tag in ("*", etag):
+            return True
+    return False
+
+def chooseEncoding(acceptEncoding:str, available=ENCODINGS) -> str:
+    """get the best available compression accepted by a client, brotli then gzip, None if it accepts neither"""
+    accepted = set()
+    for part in (acceptEncoding or "").split(","):
+        name, _, parameters = part.partition(";")
+        parameters = parameters.replace(" ", "")
+        try:
+            quality = float(parameters[2:]) if parameters.startswith("q=") else 1
+        except ValueError:
+            quality = 0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return next((encoding for encoding in ENCODINGS if encoding in accepted and encoding in available), None)
+
+def compressBody(body:bytes, encoding:str) -> bytes:
+    """compress a whole answer"""
+    if encoding == "br":
+        return brotli.compress(body, quality=5)  # fast enough to be done for every answer
+    return gzip.compress(body, compresslevel=6)
+
+def parseRetryAfter(retryAfter:str) -> float:
+    """get the seconds to wait from the Retry-After header of curseforge"""
+    return float(retryAfter) if retryAfter and retryAfter.isdigit() else 1.0  # it can also be a date, rarely used
+
+def streamedAnswerHeaders(acceptEncoding:str) -> tuple:
+    """choose the compression of an answer forwarded as it arrives, return (encoding or None, headers),
+    its etag is unknown until the whole body was received, the next identical requests get it from the cache"""
+    encoding = chooseEncoding(acceptEncoding)
+    if not encoding:
+        return None, {}
+    return encoding, {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+
+
+class StreamCompressor():
+    def __init__(self, encoding:str):
+        """compresses an answer chunk by chunk while it is forwarded"""
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=5)
+            self.compressChunk, self.finish = self.compressor.process, self.compressor.finish
+        else:
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 makes a gzip stream
+            self.compressChunk, self.finish = self.compressor.compress, self.compressor.flush
+
+
+class Answer():
+    def __init__(self, status:int, contentType:str, body:bytes, headers:dict=None, etag:str=None, variants:dict=None):
+        """an answer of the curseforge api received in full, its etag and compressed bodies are made once and reused for every client"""
+        self.status = status
+        self.contentType = contentType
+        self.body = body
+        self.headers = headers or {}  # sent to every client, like Retry-After
+        self.etag = etag or strongEtag(body)
+        self.variants = variants or {}  # encoding -> compressed body, like the one already made while streaming it
+        self.size = len(body) + sum(len(variant) for variant in self.variants.values())
+
+    def compressAll(self):
+        """make the missing compressed bodies, only worth it for the answers kept in the cache"""
+        if len(self.body) < MIN_COMPRESSED_SIZE:
+            return
+        for encoding in ENCODINGS:
+            if encoding not in self.variants:
+                self.variants[encoding] = compressBody(self.body, encoding)
+        self.size = len(self.body) + sum(len(variant) for variant in self.variants.values())
+
+    def respond(self, ifNoneMatch:str, acceptEncoding:str) -> tuple:
+        """get the answer for a client, nothing if it already has it and compressed if it accepts it, as (status, headers, body)"""
+        encoding = chooseEncoding(acceptEncoding, self.variants)
+        headers = {**self.headers, "Vary": "Accept-Encoding"}
+        if self.status == 200:
+            headers["ETag"] = encodedEtag(self.etag, encoding)
+            if etagMatches(ifNoneMatch, self.etag):
+                return 304, headers, b""
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return self.status, headers, self.variants[encoding]
+        return self.status, headers, self.body
+
+
+def tooManyRequestsAnswer(retryAfter:float) -> Answer:
+    """the answer refusing a request, and the identical ones waiting for it, when too many are waiting for the api key"""
+    return Answer(429, "application/json", b'{"error": "too many requests, try again later"}', {"Retry-After": str(math.ceil(retryAfter))})
+
+
+class ResponseCache():
+    def __init__(self, maxBytes:int, dbPath:str=None):
+        """an in memory cache of the answers of the curseforge api with a size budget and least recently used eviction,
+        optionally backed by a sqlite database shared by several worker processes"""
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # key -> (expiry time, answer), least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.dbPath = dbPath
+        self.local = threading.local()  # sqlite connections can't be shared between threads
+        self.lastPrune = time.monotonic()
+        if dbPath:
+            with self.connection() as db:
+                db.execute("DROP TABLE IF EXISTS responses")  # older format, without etags nor compressed bodies
+                db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, expires REAL, status INTEGER, contentType TEXT, headers TEXT, "
+                           "etag TEXT, body BLOB, gzip BLOB, br BLOB)")
+                db.execute("CREATE INDEX IF NOT EXISTS answersExpires ON answers (expires)")
+
+    def connection(self) -> sqlite3.Connection:
+        """get the sqlite connection of the current thread"""
+        if getattr(self.local, "db", None) is None:
+            self.local.db = sqlite3.connect(self.dbPath, timeout=5)
+            self.local.db.execute("PRAGMA journal_mode=WAL")  # readers don't wait for the writers of other processes
+        return self.local.db
+
+    def get(self, key:str) -> Answer:
+        """get a fresh cached answer, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                self.remove(key)
+        if self.dbPath:
+            try:
+                row = self.connection().execute("SELECT expires, status, contentType, headers, etag, body, gzip, br FROM answers WHERE key = ? AND expires > ?", (key, now)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                variants = {encoding: bytes(variant) for encoding, variant in (("gzip", row[6]), ("br", row[7])) if variant is not None}
+                answer = Answer(row[1], row[2], bytes(row[5]), json.loads(row[3]), row[4], variants)
+                self.putMemory(key, (row[0], answer))
+                return answer
+        return None
+
+    def put(self, key:str, endpoint:str, answer:Answer):
+        """cache an answer for the time to live of its endpoint"""
+        entry = (time.time() + endpointTtl(endpoint), answer)
+        self.putMemory(key, entry)
+        if self.dbPath:
+            try:
+                with self.connection() as db:
+                    db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, entry[0], answer.status, answer.contentType, json.dumps(answer.headers), answer.etag, answer.body,
+                                answer.variants.get("gzip"), answer.variants.get("br")))
+                    if self.pruneDue():  # not on every write, the write lock is shared by every worker process
+                        db.execute("DELETE FROM answers WHERE expires < ?", (time.time(),))
+            except sqlite3.Error:
+                pass  # the memory cache still works
+
+    def pruneDue(self) -> bool:
+        """check if it is time to delete the expired answers of the sqlite cache, at most once per interval"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.lastPrune < PRUNE_INTERVAL:
+                return False
+            self.lastPrune = now
+            return True
+
+    def putMemory(self, key:str, entry:tuple):
+        """store an entry in memory, evicting the least recently used ones to stay in the budget"""
+        if entry[1].size > self.maxBytes:
+            return
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = entry
+            self.size += entry[1].size
+            while self.size > self.maxBytes:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key:str):
+        """remove an entry from memory, the lock must be held"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1].size
+
+
+class Flight():
+    def __init__(self):
+        """an upstream request that identical requests wait for instead of sending their own"""
+        self.done = threading.Event()
+        self.result = None  # answer, None if the request failed
+
+
+class SingleFlight():
+    def __init__(self):
+        """the upstream requests in progress, so that identical requests share a single one"""
+        self.flights = {}  # key -> flight
+        self.lock = threading.Lock()
+
+    def join(self, key:str) -> tuple:
+        """get the flight of a request and whether the caller is its leader, which must send it and finish it"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self.flights[key] = Flight()
+            return flight, True
+
+    def finish(self, key:str, result:tuple):
+        """give the result of a request to the waiting ones"""
+        with self.lock:
+            flight = self.flights.pop(key, None)
+        if flight is not None:
+            flight.result = result
+            flight.done.set()
+
+
+class TokenBucket():
+    def __init__(self, rate:float, burst:int):
+        """limits the upstream requests to a rate per second with bursts, shared by every request of the process"""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.pausedUntil = 0  # set when curseforge asks to slow down
+        self.lock = threading.Lock()
+
+    def reserve(self, maxWait:float) -> tuple:
+        """take a token, return (True, seconds to wait before sending) or (False, seconds to retry after) if the wait would be too long"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+            self.updated = now
+            wait = max((1 - self.tokens)/self.rate if self.tokens < 1 else 0, self.pausedUntil - now)
+            if wait > maxWait:
+                return False, wait
+            self.tokens -= 1
+            return True, wait
+
+    def acquire(self, maxWait:float) -> float:
+        """wait for a token in the queue, return 0 once it is taken or the seconds to retry after if the queue is too long"""
+        acquired, wait = self.reserve(maxWait)
+        if not acquired:
+            return wait
+        if wait:
+            time.sleep(wait)
+        return 0
+
+    def pause(self, seconds:float):
+        """send no request for a while, after curseforge answered too many requests"""
+        with self.lock:
+            self.pausedUntil = max(self.pausedUntil, time.monotonic() + seconds)
@@ -1,6 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+import proxyCache  # local module
+import threading
 import requests
+import math
 import os
 
 app = Flask(__name__)
@@ -11,8 +15,23 @@ load_dotenv()
 # configuring curseforge api
 CURSEFORGE_API_BASE_URL = "https://api.curseforge.com/v1"
 HEADERS = {"x-api-key": os.getenv("CURSEFORGE_API_KEY")}
+TIMEOUT = (float(os.getenv("PROXY_CONNECT_TIMEOUT", 5)), float(os.getenv("PROXY_READ_TIMEOUT", 30)))  # seconds to connect and between two received bytes
+CHUNK_SIZE = 64*1024  # bytes forwarded at once to the client
 
-@app.route("/curseforge/<path:endpoint>", methods=["GET"])
+# kept-alive connections to curseforge, reused by every request
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", HTTPAdapter(pool_maxsize=int(os.getenv("PROXY_POOL_SIZE", 32))))
+
+# answers shared by every client, in memory and optionally in a sqlite file shared by the worker processes
+cache = proxyCache.ResponseCache(int(os.getenv("PROXY_CACHE_MAX_MB", 256))*1024*1024, os.getenv("PROXY_CACHE_DB"))
+# identical requests in progress share one upstream request
+flights = proxyCache.SingleFlight()
+# protects the quota of the api key, requests wait in line up to MAX_QUEUE_WAIT seconds before being refused
+limiter = proxyCache.TokenBucket(float(os.getenv("PROXY_RATE_LIMIT", 10)), int(os.getenv("PROXY_RATE_BURST", 20)))
+MAX_QUEUE_WAIT = float(os.getenv("PROXY_MAX_QUEUE_WAIT", 10))
+
+@app.route("/curseforge/<path:endpoint>", methods=["GET", "POST"])
 def proxyToCurseforge(endpoint):
     """interact with the curseforge api using the key"""
     # target url
@@ -21,22 +40,135 @@ def proxyToCurseforge(endpoint):
     query_params = request.args.to_dict()
     # get http method
     method = request.method
+    body = request.get_json(silent=True) if method == "POST" else None
+
+    # answer from the cache if the same request was made recently
+    key = proxyCache.cacheKey(method, endpoint, query_params, body)
+    cached = cache.get(key)
+    if cached is not None:
+        return fullAnswer(cached)
+
+    # wait for the same request if another client already sent it, if it fails try once more, with our own request or the one of another waiting client
+    for attempt in range(2):
+        flight, leader = flights.join(key)
+        if leader:
+            break
+        if flight.done.wait(TIMEOUT[0] + TIMEOUT[1] + MAX_QUEUE_WAIT) and flight.result is not None:
+            return fullAnswer(flight.result)
+    else:
+        return jsonify({"error": "the identical request in progress failed"}), 502
+
+    # wait for our turn to use the api key
+    retry_after = limiter.acquire(MAX_QUEUE_WAIT)
+    if retry_after:
+        answer = proxyCache.tooManyRequestsAnswer(retry_after)
+        flights.finish(key, answer)  # the identical requests get the same 429
+        return fullAnswer(answer)
 
     try:
-        # send request to curseforge
+        # send request to curseforge, the body is only read while it is forwarded
         if method == "GET":
-            response = requests.get(url, headers=HEADERS, params=query_params)
+            response = session.get(url, params=query_params, timeout=TIMEOUT, stream=True)
+        elif method == "POST":  # bulk endpoints such as mods and mods/files take a json body
+            response = session.post(url, params=query_params, json=body, timeout=TIMEOUT, stream=True)
         else:
+            flights.finish(key, None)
             return jsonify({"error": "HTTP method not supported"}), 405
-        # return query results to the client
-        return jsonify(response.json()), response.status_code
-
+    except requests.exceptions.Timeout as e:
+        flights.finish(key, None)
+        return jsonify({"error": str(e)}), 504
     except requests.exceptions.RequestException as e:
-        # send an error if needed
+        flights.finish(key, None)
+        return jsonify({"error": str(e)}), 502
+
+    # curseforge asks to slow down, stop sending requests for a while and tell the client and the identical requests
+    forwarded_headers = {}
+    if response.status_code == 429:
+        retry_after = proxyCache.parseRetryAfter(response.headers.get("Retry-After"))
+        limiter.pause(retry_after)
+        forwarded_headers["Retry-After"] = str(math.ceil(retry_after))
+
+    # forward the bytes of curseforge as they arrive, without parsing them, compressed if the client accepts it
+    content_type = response.headers.get("Content-Type", "application/json")
+    encoding, headers = proxyCache.streamedAnswerHeaders(request.headers.get("Accept-Encoding"))
+    headers.update(forwarded_headers)
+    upstream = UpstreamBody(response, key, endpoint, content_type, forwarded_headers, encoding)
+    proxied = Response(upstream.forward(), status=response.status_code, content_type=content_type, headers=headers)
+    proxied.call_on_close(upstream.close)
+    return proxied
+
+def fullAnswer(answer:proxyCache.Answer):
+    """answer with a body already received in full, from the cache or from an identical request"""
+    status, headers, content = answer.respond(request.headers.get("If-None-Match"), request.headers.get("Accept-Encoding"))
+    return Response(content, status=status, content_type=answer.contentType, headers=headers)
+
+
+class UpstreamBody():
+    def __init__(self, response:requests.Response, key:str, endpoint:str, content_type:str, forwarded_headers:dict, encoding:str=None):
+        """the body of an upstream answer forwarded to the client that sent the request, read to its end even if that client leaves,
+        so that the identical requests and the cache still get it"""
+        self.response = response
+        self.key = key
+        self.endpoint = endpoint
+        self.content_type = content_type
+        self.forwarded_headers = forwarded_headers
+        self.encoding = encoding
+        self.upstream = response.iter_content(chunk_size=CHUNK_SIZE)
+        self.compressor = proxyCache.StreamCompressor(encoding) if encoding else None
+        self.chunks = []
+        self.compressed = []  # the compressed body sent to the client is reused instead of compressing it again
+        self.compressed_complete = False
+        self.finished = False
+
+    def forward(self):
+        """yield the body by chunks, compressed if an encoding was chosen"""
         try:
-            return jsonify({"error": str(e)}), response.status_code
-        except :
-            return jsonify({"error": str(e)}), 500
+            for chunk in self.upstream:
+                self.chunks.append(chunk)
+                if self.compressor:
+                    chunk = self.compressor.compressChunk(chunk)
+                    self.compressed.append(chunk)
+                yield chunk
+            if self.compressor:
+                self.compressed.append(self.compressor.finish())
+                self.compressed_complete = True
+                yield self.compressed[-1]
+        except requests.exceptions.RequestException:
+            self.finish(False)  # the connection to curseforge was lost, the client gets a truncated answer and nothing is cached
+            return
+        self.finish(True)
+
+    def close(self):
+        """called once the answer is closed, the body is read to its end in the background if the client left before"""
+        if not self.finished:
+            self.finished = True
+            threading.Thread(target=self.drain, daemon=True).start()
+
+    def drain(self):
+        """read the rest of the body for the identical requests and the cache"""
+        try:
+            for chunk in self.upstream:
+                self.chunks.append(chunk)
+        except requests.exceptions.RequestException:
+            self.finish(False)
+            return
+        self.finish(True)
+
+    def finish(self, complete:bool):
+        """cache the answer if it is a complete success, give it to the identical requests and give the connection back to the pool"""
+        self.finished = True
+        answer = None
+        try:
+            if complete:
+                variants = {self.encoding: b"".join(self.compressed)} if self.compressed_complete else None
+                answer = proxyCache.Answer(self.response.status_code, self.content_type, b"".join(self.chunks), self.forwarded_headers, variants=variants)
+                if answer.status == 200:
+                    answer.compressAll()
+                    cache.put(self.key, self.endpoint, answer)
+        finally:
+            flights.finish(self.key, answer)
+            self.response.close()
+
 
 if __name__ == "__main__":
     # run the app